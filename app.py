@@ -1,71 +1,72 @@
+import time
+# Awal eksekusi script, untuk mengukur waktu startup
+SCRIPT_STARTED = time.perf_counter()
+
 import streamlit as st
-import google.generativeai as genai
 from dotenv import load_dotenv
 import os
 import tempfile
-import re
-import json
 import uuid
-from fpdf import FPDF
-import base64
-import time
-import requests
-import pandas as pd
-import datetime
-from io import BytesIO
-from iotrecorder import microfon
+import hashlib
+from models import get_model, supports, mark_unsupported
+from geminifiles import upload_audio, file_sha256, forget
+import resultcache
+import ratelimit
+import metrics
+import vad
+import cachedir
+from transcoder import ffmpeg_available, transcode, decode_wav, find_variant, FORMATS
+from quizstore import QuizStore
+from questionbank import QuestionBank, shuffle_variant
+from quizschema import QUIZ_SCHEMA, parse_quiz, find_invalid_questions, collect_valid_questions
+from spool import Spool
+from jobs import JobQueue, ACTIVE_STATES
+from audiosegments import wav_duration, plan_segments, write_segment, map_segments, stage_lock, format_timestamp
 
 # Load environment variables
 load_dotenv()
 
-# Konfigurasi API Gemini
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+# Konfigurasi (API key Gemini dibaca oleh models saat model pertama dipakai)
 FLASK_SERVER_URL = os.getenv("FLASK_SERVER")
-print("FLASK_SERVER_URL:", FLASK_SERVER_URL)
-
-genai.configure(api_key=GOOGLE_API_KEY)
+# Folder uploads milik server Flask jika berjalan di mesin yang sama; rekaman dibaca langsung tanpa transfer
+SHARED_UPLOADS_DIR = os.getenv("SHARED_UPLOADS_DIR")
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+QUIZ_DB_PATH = os.getenv("QUIZ_DB_PATH", os.path.join("data", "quizzes.sqlite3"))
+QUIZ_LIST_PAGE_SIZE = 20
+QUIZ_DIFFICULTIES = ["Easy", "Medium", "Hard"]
+# Jumlah trace terakhir yang ditampilkan di halaman Diagnostik
+DIAGNOSTICS_TRACES = 20
+# Jumlah soal yang disiapkan di bank soal per tingkat kesulitan
+QUESTION_BANK_TARGET = int(os.getenv("QUESTION_BANK_TARGET", "30"))
+# Antrian job model: jumlah pekerjaan yang berjalan bersamaan dan interval polling UI
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join("data", "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Pool terpisah untuk quiz dan PDF agar tidak menunggu di belakang ringkasan/modul yang panjang
+JOB_INTERACTIVE_WORKERS = int(os.getenv("JOB_INTERACTIVE_WORKERS", "2"))
+JOB_POLL_SECONDS = 1
+metrics.log(f"FLASK_SERVER_URL: {FLASK_SERVER_URL}")
 
 # Inisialisasi session state
 if 'current_page' not in st.session_state:
     st.session_state.current_page = 'home'
-if 'quizzes' not in st.session_state:
-    st.session_state.quizzes = {}
+if 'quiz_list_page' not in st.session_state:
+    st.session_state.quiz_list_page = 0
+if 'variant_seed' not in st.session_state:
+    # Seed varian soal per siswa (urutan soal dan opsi)
+    st.session_state.variant_seed = uuid.uuid4().hex
 if 'user_type' not in st.session_state:
     st.session_state.user_type = None
 
-# Fungsi untuk audio summarize
-def summarize(audio_file_path):
-    audio_file = genai.upload_file(path=audio_file_path)
-    model_summarize = genai.GenerativeModel(
-        model_name="gemini-2.0-flash-thinking-exp-01-21",
-        generation_config={
-            'temperature': 0.0,
-            'top_p': 1.0,
-            'top_k': 0
-        }
-    )
-    response = model_summarize.generate_content([
-        {"role": "user", "parts": ["ringkas audio ini dan berikan poin poin penting yang harus diketahui"]},
-        {"role": "user", "parts": [audio_file]}
-    ])
-    return response.text
+MODEL_NAME = "gemini-2.0-flash-thinking-exp-01-21"
 
-# Fungsi untuk membuat modul    
-def modul(audio_file_path):
-    audio_file = genai.upload_file(path=audio_file_path)
-    
-    model_modul = genai.GenerativeModel(
-        model_name="gemini-2.0-flash-thinking-exp-01-21",
-        generation_config={
-            'max_output_tokens': 300000,
-            'temperature': 0.2,
-            'top_p': 1.0,
-            'top_k': 0
-        }
-    )
+SUMMARIZE_PROMPT = "ringkas audio ini dan berikan poin poin penting yang harus diketahui"
+SUMMARIZE_CONFIG = {
+    'temperature': 0.0,
+    'top_p': 1.0,
+    'top_k': 0
+}
 
-    response = model_modul.generate_content([
-        """
+MODUL_PROMPT = """
         Buatkan modul pelajaran yang lengkap dan terstruktur berdasarkan isi audio berikut.
 
         Kriteria:
@@ -79,35 +80,15 @@ def modul(audio_file_path):
         - Gunakan paragraf panjang dan penjelasan mendalam.
         - Tidak perlu diringkas, tapi jelaskan rinci.
         - jangan ada kalimat pembuka darimu langsung subheading modul
-        """,
-        audio_file
-    ])
-
-    return response.text
-
-# Fungsi untuk menyimpan file yang diupload
-def save_uploaded_file(uploaded_file):
-    try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.' + uploaded_file.name.split('.')[-1]) as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            return tmp_file.name
-    
-    except Exception as e:
-        st.error(f'Kesalahan saat upload file {e}')
-        return None
+        """
+MODUL_CONFIG = {
+    'max_output_tokens': 300000,
+    'temperature': 0.2,
+    'top_p': 1.0,
+    'top_k': 0
+}
 
-def generate_quiz(material, difficulty="Medium", num_questions=5):
-    # Inisialisasi model generatif
-    model = genai.GenerativeModel(
-        model_name="gemini-2.0-flash-thinking-exp-01-21",  # Ganti dengan model yang sesuai
-        generation_config={
-            "temperature": 0.05,
-            "max_output_tokens": 100000
-        }
-    )
-    
-    # Membuat prompt
-    prompt = f"""
+QUIZ_PROMPT = """
     Buat {num_questions} soal kuis pilihan ganda berdasarkan teks berikut:
     ---
     {material}
@@ -134,38 +115,401 @@ def generate_quiz(material, difficulty="Medium", num_questions=5):
     2. Pastikan 'correct_text' sama persis dengan salah satu opsi
     3. Format output HARUS JSON dan valid, tanpa komentar atau teks tambahan
     """
-    
-    # Generate content menggunakan model
-    response = model.generate_content(prompt)
-    
-    # Tampilkan response untuk debugging
-    print("Response dari model:", response.text)
-    
+QUIZ_CONFIG = {
+    "temperature": 0.05,
+    "max_output_tokens": 100000
+}
+# Structured output: model diminta mengembalikan JSON sesuai QUIZ_SCHEMA
+QUIZ_STRUCTURED_OUTPUT = os.getenv("QUIZ_STRUCTURED_OUTPUT", "1") == "1"
+QUIZ_STRUCTURED_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": QUIZ_SCHEMA
+}
+# Berapa kali soal yang tidak valid boleh dibuat ulang sebelum menyerah
+QUIZ_REPAIR_ROUNDS = 2
+QUIZ_REPAIR_NOTE = """
+    Soal-soal berikut sudah ada, jangan diulang atau dibuat mirip:
+    {existing}
+    """
+
+# Rekaman yang lebih panjang dari ini diproses per segmen (map-reduce)
+LONG_AUDIO_SECONDS = int(os.getenv("LONG_AUDIO_SECONDS", "1200"))
+SEGMENT_SECONDS = int(os.getenv("SEGMENT_SECONDS", "600"))
+SEGMENT_OVERLAP_SECONDS = int(os.getenv("SEGMENT_OVERLAP_SECONDS", "20"))
+SEGMENT_WORKERS = int(os.getenv("SEGMENT_WORKERS", "4"))
+# 16 kHz / 16-bit mono dari firmware ESP32
+WAV_BYTES_PER_SECOND = 16000 * 2
+# Format kompresi segmen sebelum diupload ke Gemini (jika ffmpeg tersedia)
+TRANSCODE_FORMAT = os.getenv("TRANSCODE_FORMAT", "flac")
+
+SEGMENT_PROMPT = """
+        Audio ini adalah bagian {number} dari {total} sebuah rekaman pelajaran (menit {start} sampai {end}).
+        Tuliskan catatan rinci berisi semua konsep, definisi, contoh, dan penjelasan
+        yang disampaikan pada bagian ini secara berurutan.
+        - jangan ada kalimat pembuka darimu langsung isi catatan
+        """
+SEGMENT_CONFIG = {
+    'temperature': 0.0,
+    'top_p': 1.0,
+    'top_k': 0
+}
+REDUCE_PROMPT = """
+        Audio pelajaran terlalu panjang sehingga sudah diubah menjadi catatan per bagian di bawah ini.
+        Bagian yang berdekatan saling tumpang tindih beberapa detik, abaikan pengulangan di batasnya.
+        Perlakukan seluruh catatan sebagai isi satu audio utuh.
+        """
+# Ditambahkan ke hasil yang berhenti di batas panjang output model
+TRUNCATED_NOTE = "\n\n---\n⚠️ *Hasil terpotong karena melebihi batas panjang output model; bagian akhir mungkin hilang.*"
+
+# Hasil dari versi prompt lama tidak lagi valid
+resultcache.register_prompt('summarize', SUMMARIZE_PROMPT)
+resultcache.register_prompt('modul', MODUL_PROMPT)
+resultcache.register_prompt('quiz', QUIZ_PROMPT)
+resultcache.register_prompt('segment', SEGMENT_PROMPT)
+
+# Respons yang diblokir (SAFETY, RECITATION, ...) atau kosong dianggap gagal.
+# Respons yang terpotong di batas output (MAX_TOKENS) tetap dipakai, tetapi complete=False
+# agar tidak tersimpan di cache sebagai hasil. Mengembalikan (text, complete).
+def check_complete(response, text):
+    reason = 'STOP'
+    candidates = getattr(response, 'candidates', None)
+    if candidates is not None:
+        if not candidates:
+            block_reason = getattr(getattr(response, 'prompt_feedback', None), 'block_reason', None)
+            raise ValueError(f"Respons model diblokir ({getattr(block_reason, 'name', block_reason)})")
+        reason = candidates[0].finish_reason
+        reason = getattr(reason, 'name', reason)
+        if reason not in ('STOP', 'MAX_TOKENS'):
+            raise ValueError(f"Respons model tidak selesai (finish_reason: {reason})")
+    if not text.strip():
+        raise ValueError("Model tidak mengembalikan teks")
+    return text, reason == 'STOP'
+
+# Jalankan model lewat rate limiter, dengan on_chunk teks parsial dikirim setiap kali chunk baru datang.
+# Mengembalikan (text, complete); teks yang terpotong diberi peringatan di akhir.
+def generate_text(model, contents, on_chunk=None, priority=ratelimit.PRIORITY_NORMAL):
+    if on_chunk is None:
+        response = ratelimit.generate(model, contents, priority)
+        return with_truncation_note(*check_complete(response, response.text))
+
+    parts = []
+    def stream():
+        # Percobaan ulang setelah error mulai lagi dari awal
+        parts.clear()
+        started = time.perf_counter()
+        response = model.generate_content(contents, stream=True)
+        for chunk in response:
+            try:
+                parts.append(chunk.text)
+            except ValueError:
+                # Chunk tanpa teks (misalnya hanya finish_reason)
+                continue
+            if len(parts) == 1:
+                # Latensi sampai teks pertama muncul di layar
+                metrics.observe('gemini.first_chunk', time.perf_counter() - started)
+            on_chunk("".join(parts))
+        return response
+
+    response = ratelimit.call(stream, contents, priority)
+    return with_truncation_note(*check_complete(response, "".join(parts)))
+
+def with_truncation_note(text, complete):
+    return (text if complete else text + TRUNCATED_NOTE), complete
+
+# Handle yang ditolak Gemini sebelum TTL lokal habis (file dihapus di server, gagal diproses,
+# API key berganti) dilupakan, lalu file diupload ulang dan permintaan diulang sekali
+def with_uploaded_audio(path, digest, call):
+    from google.api_core import exceptions as google_exceptions
+    digest = digest or file_sha256(path)
     try:
-        # Ambil hanya bagian JSON valid dari response
-        json_str = re.search(r'\{[\s\S]*\}', response.text)
-        
-        # Pastikan kita menemukan JSON yang valid
-        if json_str:
-            json_str = json_str.group()
-            quiz_data = json.loads(json_str)
+        return call(upload_audio(path, digest=digest))
+    except (google_exceptions.NotFound, google_exceptions.PermissionDenied) as e:
+        metrics.log(f"Handle file Gemini ditolak ({type(e).__name__}), upload ulang")
+        metrics.incr('gemini.file_upload.rejected')
+        forget(digest)
+        return call(upload_audio(path, digest=digest))
+
+# Rekaman terkompresi (varian dari server atau mp3) didekode ke WAV untuk VAD dan pemotongan segmen.
+# Hasilnya di-cache bersama file VAD dan ikut dievict.
+def decoded_audio(audio_file_path, audio_hash):
+    if audio_file_path.lower().endswith('.wav') or not ffmpeg_available():
+        return audio_file_path
+    path = vad.cache_path(f"{audio_hash}.decoded.wav")
+    with stage_lock(path):
+        if os.path.isfile(path):
+            cachedir.touch(path)
         else:
-            raise ValueError("Tidak ditemukan format JSON yang valid dalam response.")
-        
-        # Validasi data kuis
-        for question in quiz_data["quiz"]:
-            if question["correct_answer"] not in ['a', 'b', 'c', 'd']:
-                raise ValueError("Jawaban benar harus salah satu dari opsi: a, b, c, d")
-            if question["correct_text"] != question["options"].get(question["correct_answer"]):
-                raise ValueError("Teks jawaban benar tidak cocok dengan opsi yang dipilih")
-        
+            os.makedirs(vad.VAD_CACHE_DIR, exist_ok=True)
+            with metrics.span('audio.decode'):
+                decode_wav(audio_file_path, path)
+            vad.evict()
+    return path
+
+# Audio yang dikirim ke model: jeda hening panjang dipadatkan dulu jika VAD aktif.
+# 'source' adalah file yang diterima; jika tidak ada yang dipotong, file itulah yang diupload utuh.
+def prepare_audio(audio_file_path, audio_hash):
+    wav_path = decoded_audio(audio_file_path, audio_hash)
+    if vad.VAD_ENABLED:
+        with metrics.span('audio.vad'):
+            trimmed = vad.trimmed(wav_path, audio_hash)
+            if trimmed:
+                metrics.annotate(original_seconds=round(trimmed['timemap']['original_seconds'], 1),
+                                 trimmed_seconds=round(trimmed['timemap']['trimmed_seconds'], 1))
+        if trimmed:
+            return dict(trimmed, source=audio_file_path)
+    return {'path': wav_path, 'digest': audio_hash, 'timemap': None, 'source': audio_file_path}
+
+# File untuk upload utuh: varian terkompresi dipakai apa adanya, WAV hasil VAD dikompresi di sini
+def compressed_audio(audio):
+    if audio['timemap'] is None and audio['source'] != audio['path']:
+        return audio['source']
+    if not (vad.VAD_ENABLED and ffmpeg_available() and audio['path'].lower().endswith('.wav')):
+        return audio['path']
+    path = vad.cache_path(f"{audio['digest']}.{FORMATS[TRANSCODE_FORMAT]['ext']}")
+    with stage_lock(path):
+        if os.path.isfile(path):
+            cachedir.touch(path)
+        else:
+            with metrics.span('audio.transcode'):
+                transcode(audio['path'], path, TRANSCODE_FORMAT)
+            vad.evict()
+    return path
+
+# Pengaturan segmen ikut menjadi bagian kunci cache hasil rekaman panjang
+def segment_settings(audio_file_path):
+    duration = wav_duration(audio_file_path)
+    if duration is None or duration <= LONG_AUDIO_SECONDS:
+        return None
+    return {
+        'segment_seconds': SEGMENT_SECONDS,
+        'overlap_seconds': SEGMENT_OVERLAP_SECONDS,
+        'reduce_prompt': REDUCE_PROMPT
+    }
+
+# Tahap map: catatan tiap segmen dibuat paralel, lalu digabung berurutan.
+# timemap (dari VAD) mengubah waktu segmen kembali ke waktu di rekaman asli.
+def segment_notes(audio_file_path, audio_hash, timemap=None):
+    segments = plan_segments(audio_file_path, SEGMENT_SECONDS, SEGMENT_OVERLAP_SECONDS)
+    model_segment = get_model(MODEL_NAME, SEGMENT_CONFIG)
+    # Span tiap segmen dicatat di bawah span pemanggil walau berjalan di thread lain
+    parent_span = metrics.current()
+
+    def note_segment(segment):
+        with metrics.attach(parent_span), metrics.span('segment', index=segment['index']):
+            return note_segment_traced(segment)
+
+    def note_segment_traced(segment):
+        if timemap:
+            start = format_timestamp(vad.to_original(timemap, segment['start']))
+            end = format_timestamp(vad.to_original(timemap, segment['end']))
+        else:
+            start = format_timestamp(segment['start'])
+            end = format_timestamp(segment['end'])
+        cache_key = resultcache.make_key(
+            audio_hash, SEGMENT_PROMPT, MODEL_NAME, SEGMENT_CONFIG,
+            extra={'start_frame': segment['start_frame'], 'frames': segment['frames'], 'total': len(segments)}
+        )
+        notes = resultcache.get(cache_key)
+        metrics.annotate(cached=notes is not None)
+        if notes is None:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                with metrics.span('segment.prepare'):
+                    segment_path = write_segment(
+                        audio_file_path, segment, os.path.join(tmp_dir, f"segment_{segment['index']}.wav")
+                    )
+                    if ffmpeg_available():
+                        segment_path = transcode(
+                            segment_path, f"{segment_path}.{FORMATS[TRANSCODE_FORMAT]['ext']}", TRANSCODE_FORMAT
+                        )
+                prompt = SEGMENT_PROMPT.format(
+                    number=segment['index'] + 1, total=len(segments), start=start, end=end
+                )
+                response = with_uploaded_audio(
+                    segment_path, None, lambda segment_file: ratelimit.generate(model_segment, [prompt, segment_file])
+                )
+            notes, complete = check_complete(response, response.text)
+            if complete:
+                resultcache.put(cache_key, 'segment', SEGMENT_PROMPT, notes)
+        else:
+            complete = True
+        return f"[Bagian {segment['index'] + 1} | {start} - {end}]\n{notes}", complete
+
+    # Summarize dan modul yang berjalan bersamaan berbagi hasil map yang sama.
+    # Mengembalikan (catatan, complete); complete=False jika ada catatan segmen yang terpotong.
+    with stage_lock(audio_hash), metrics.span('segments', count=len(segments)):
+        results = map_segments(segments, note_segment, SEGMENT_WORKERS)
+    return "\n\n".join(notes for notes, _ in results), all(complete for _, complete in results)
+
+# Fungsi untuk audio summarize
+@metrics.traced('summarize')
+def summarize(audio_file_path, on_chunk=None):
+    with metrics.span('audio.hash'):
+        audio_hash = file_sha256(audio_file_path)
+    audio = prepare_audio(audio_file_path, audio_hash)
+    segmented = segment_settings(audio['path'])
+    cache_key = resultcache.make_key(audio['digest'], SUMMARIZE_PROMPT, MODEL_NAME, SUMMARIZE_CONFIG, extra=segmented)
+    cached = resultcache.get(cache_key)
+    metrics.annotate(cached=cached is not None, segmented=bool(segmented))
+    if cached is not None:
+        if on_chunk:
+            on_chunk(cached)
+        return cached
+
+    model_summarize = get_model(MODEL_NAME, SUMMARIZE_CONFIG)
+
+    def summarize_part(audio_part):
+        return generate_text(model_summarize, [
+            {"role": "user", "parts": [SUMMARIZE_PROMPT]},
+            {"role": "user", "parts": [audio_part]}
+        ], on_chunk)
+
+    notes_complete = True
+    if segmented:
+        # Tahap reduce: ringkasan akhir dari catatan semua segmen
+        notes, notes_complete = segment_notes(audio['path'], audio['digest'], audio['timemap'])
+        summary, complete = summarize_part(REDUCE_PROMPT + "\n" + notes)
+    else:
+        summary, complete = with_uploaded_audio(compressed_audio(audio), audio['digest'], summarize_part)
+    # Hasil yang terpotong (atau disusun dari catatan yang terpotong) ditampilkan tetapi tidak di-cache
+    if complete and notes_complete:
+        resultcache.put(cache_key, 'summarize', SUMMARIZE_PROMPT, summary)
+    return summary
+
+# Fungsi untuk membuat modul    
+@metrics.traced('modul')
+def modul(audio_file_path, on_chunk=None):
+    with metrics.span('audio.hash'):
+        audio_hash = file_sha256(audio_file_path)
+    audio = prepare_audio(audio_file_path, audio_hash)
+    segmented = segment_settings(audio['path'])
+    cache_key = resultcache.make_key(audio['digest'], MODUL_PROMPT, MODEL_NAME, MODUL_CONFIG, extra=segmented)
+    cached = resultcache.get(cache_key)
+    metrics.annotate(cached=cached is not None, segmented=bool(segmented))
+    if cached is not None:
+        if on_chunk:
+            on_chunk(cached)
+        return cached
+
+    model_modul = get_model(MODEL_NAME, MODUL_CONFIG)
+
+    def modul_part(audio_part):
+        return generate_text(model_modul, [
+            MODUL_PROMPT,
+            audio_part
+        ], on_chunk, priority=ratelimit.PRIORITY_BATCH)
+
+    notes_complete = True
+    if segmented:
+        # Tahap reduce: modul disusun dari catatan semua segmen
+        notes, notes_complete = segment_notes(audio['path'], audio['digest'], audio['timemap'])
+        modul_text, complete = modul_part(REDUCE_PROMPT + "\n" + notes)
+    else:
+        modul_text, complete = with_uploaded_audio(compressed_audio(audio), audio['digest'], modul_part)
+
+    if complete and notes_complete:
+        resultcache.put(cache_key, 'modul', MODUL_PROMPT, modul_text)
+    return modul_text
+
+# Minta model membuat soal dan parse hasilnya; structured output jika didukung model
+def request_questions(material, difficulty, num_questions, existing=None, priority=ratelimit.PRIORITY_INTERACTIVE):
+    prompt = QUIZ_PROMPT.format(
+        num_questions=num_questions,
+        material=material,
+        difficulty=difficulty
+    )
+    if existing:
+        prompt += QUIZ_REPAIR_NOTE.format(existing="\n".join(f"- {q['question']}" for q in existing))
+
+    # Setelah model sekali menolak response_schema, langsung pakai teks bebas tanpa panggilan gagal
+    if QUIZ_STRUCTURED_OUTPUT and supports(MODEL_NAME, 'structured_output'):
+        from google.api_core import exceptions as google_exceptions
+        model = get_model(MODEL_NAME, {**QUIZ_CONFIG, **QUIZ_STRUCTURED_CONFIG})
+        try:
+            response = ratelimit.generate(model, prompt, priority)
+            with metrics.span('quiz.parse', structured=True, chars=len(response.text)):
+                return parse_quiz(response.text)["quiz"]
+        except google_exceptions.InvalidArgument as e:
+            # Model tidak mendukung response_schema, kembali ke teks bebas
+            mark_unsupported(MODEL_NAME, 'structured_output')
+            metrics.log(f"Structured output tidak didukung, memakai teks bebas: {e}")
+
+    model = get_model(MODEL_NAME, QUIZ_CONFIG)
+    response = ratelimit.generate(model, prompt, priority)
+    with metrics.span('quiz.parse', structured=False, chars=len(response.text)):
+        return parse_quiz(response.text)["quiz"]
+
+@metrics.traced('quiz')
+def generate_quiz(material, difficulty="Medium", num_questions=5):
+    material_hash = hashlib.sha256(material.encode('utf-8')).hexdigest()
+    cache_key = resultcache.make_key(
+        material_hash, QUIZ_PROMPT, MODEL_NAME, QUIZ_CONFIG,
+        extra={'difficulty': difficulty, 'num_questions': num_questions, 'structured': QUIZ_STRUCTURED_OUTPUT}
+    )
+    cached = resultcache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    try:
+        # Hanya soal yang tidak valid (atau kurang jumlahnya) yang dibuat ulang
+        questions = collect_valid_questions(
+            request_questions(material, difficulty, num_questions),
+            num_questions,
+            lambda missing, existing: request_questions(material, difficulty, missing, existing=existing),
+            QUIZ_REPAIR_ROUNDS
+        )
+
+        quiz_data = {"quiz": questions}
+        resultcache.put(cache_key, 'quiz', QUIZ_PROMPT, quiz_data)
         return quiz_data
     
-    except (json.JSONDecodeError, AttributeError) as e:
-        raise ValueError("Format JSON tidak valid atau tidak ditemukan dalam response.") from e
+    except ValueError:
+        raise
     except Exception as e:
         raise ValueError(f"Terjadi kesalahan: {str(e)}") from e
 
+# Penyimpanan quiz bersama untuk semua sesi (guru dan siswa)
+@st.cache_resource
+def get_quiz_store():
+    return QuizStore(QUIZ_DB_PATH)
+
+# Bank soal per materi, dipakai bersama semua sesi
+@st.cache_resource
+def get_question_bank():
+    return QuestionBank(QUIZ_DB_PATH)
+
+# Isi bank soal di background untuk semua tingkat kesulitan
+def fill_question_bank(bank, material, material_hash):
+    for difficulty in QUIZ_DIFFICULTIES:
+        @metrics.traced('questionbank.batch')
+        def generate_batch(count, existing, difficulty=difficulty):
+            questions = request_questions(
+                material, difficulty, count, existing=existing, priority=ratelimit.PRIORITY_BATCH
+            )
+            with metrics.span('quiz.validate'):
+                invalid_indexes = {i for i, _ in find_invalid_questions(questions)}
+            return [q for i, q in enumerate(questions) if i not in invalid_indexes]
+        bank.fill_async(material_hash, difficulty, generate_batch, QUESTION_BANK_TARGET)
+
+# Rakit quiz (dari bank soal atau model), simpan, dan kembalikan kodenya; dijalankan sebagai job
+def build_quiz(bank, store, material, material_hash, difficulty, num_questions):
+    # Rakit dari bank soal jika cukup, tanpa memanggil model
+    quiz_data = bank.assemble(material_hash, difficulty, num_questions)
+    if quiz_data is None:
+        quiz_data = generate_quiz(material, difficulty, num_questions)
+        bank.add_questions(material_hash, difficulty, quiz_data['quiz'])
+    fill_question_bank(bank, material, material_hash)
+
+    # Buat kode quiz unik lalu simpan ke penyimpanan bersama
+    quiz_code = create_quiz_code()
+    store.save(quiz_code, {
+        "data": quiz_data,
+        "material": material,
+        "difficulty": difficulty,
+        "num_questions": num_questions,
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S")
+    })
+    return quiz_code
+
 # Fungsi untuk membuat quiz code
 def create_quiz_code():
     # Membuat kode quiz yang unik
@@ -205,6 +549,9 @@ def render_sidebar():
                     st.rerun()
                 if st.button("Rekam Materi"):
                     st.session_state.current_page = 'microfon'
+                if st.button("Diagnostik"):
+                    st.session_state.current_page = 'diagnostics'
+                    st.rerun()
             elif st.session_state.user_type == "student":
                 st.header("Menu")
                 if st.button("Home"):
@@ -252,17 +599,143 @@ def render_home():
         Pilih jenis pengguna pada sidebar untuk memulai.
         """)
 
+# Export PDF: dirender sebagai job di background, hasilnya di-cache berdasarkan hash isi dokumen
+def pdf_download(name, kind, content, file_name, title):
+    import pdfexport
+    key = pdfexport.content_key(kind, content)
+    path = pdfexport.cached(key)
+    if path:
+        with open(path, 'rb') as f:
+            st.download_button(f"⬇️ Download {title}", f.read(), file_name=file_name,
+                               mime="application/pdf", key=f"download_{name}")
+        return
+
+    job_key = f"pdf_{name}_job"
+    if not st.session_state.get(job_key) and st.button(f"📄 Buat {title}", key=f"export_{name}"):
+        st.session_state[job_key] = get_jobs().submit(
+            'pdf', key, lambda progress: pdfexport.export(key, kind, content), interactive=True
+        )
+    show_job(job_key, title, f"pdf_{name}", show_progress=False)
+
 # Halaman Audio to Materi
-# Fungsi untuk menyimpan file upload
+# Spool audio bersama untuk semua sesi
+@st.cache_resource
+def get_spool():
+    return Spool()
+
+# Lease spool milik sesi ini; file sesi dilepas otomatis saat sesi berakhir
+def spool_lease():
+    if 'spool_lease' not in st.session_state:
+        st.session_state.spool_lease = get_spool().lease()
+    return st.session_state.spool_lease
+
+# Ganti audio aktif sesi, file spool sebelumnya boleh dihapus
+def set_audio_path(audio_path):
+    previous = st.session_state.get('audio_path')
+    st.session_state['audio_path'] = audio_path
+    if previous and previous != audio_path:
+        get_spool().release(previous, spool_lease())
+
+# Fungsi untuk menyimpan file upload ke spool, ditulis per potongan
 def save_uploaded_file(uploaded_file):
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.' + uploaded_file.name.split('.')[-1]) as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            return tmp_file.name
+        uploaded_file.seek(0)
+        with metrics.span('upload.spool', bytes=uploaded_file.size):
+            return get_spool().put_file(uploaded_file, '.' + uploaded_file.name.split('.')[-1], spool_lease())
     except Exception as e:
         st.error(f'Kesalahan saat upload file {e}')
         return None
 
+# Path rekaman langsung di folder uploads bersama (mode co-located), None jika tidak tersedia
+def local_recording_path(filename, need_wav):
+    if not SHARED_UPLOADS_DIR:
+        return None
+    original = os.path.join(SHARED_UPLOADS_DIR, os.path.basename(filename))
+    if need_wav and os.path.isfile(original):
+        return original
+    variant = find_variant(SHARED_UPLOADS_DIR, os.path.basename(filename), TRANSCODE_FORMAT)
+    if variant:
+        return variant
+    return original if os.path.isfile(original) else None
+
+# Unduh rekaman dari server Flask ke spool per potongan, memori tetap kecil.
+# Jika WAV asli sudah dihapus oleh retensi, server tetap mengirim varian terkompresi.
+def download_recording(filename, need_wav):
+    import httpclient
+    params = {} if need_wav else {'variant': 'compressed'}
+    with metrics.span('recording.download'), \
+            httpclient.get(f"{FLASK_SERVER_URL}/uploads/{filename}", params=params, stream=True) as response:
+        response.raise_for_status()
+        # Server menentukan format file yang dikirim (wav atau varian terkompresi)
+        served_name = response.headers.get('Content-Disposition', '').split('filename=')[-1].strip('"')
+        suffix = os.path.splitext(served_name)[1] or '.' + filename.split('.')[-1]
+        return get_spool().put_chunks(response.iter_content(DOWNLOAD_CHUNK_SIZE), suffix, spool_lease())
+
+# Antrian job bersama; pekerjaan model tetap berjalan walau guru pindah halaman atau terjadi rerun
+@st.cache_resource
+def get_jobs():
+    jobs = JobQueue(JOB_DB_PATH, max_workers=JOB_WORKERS, interactive_workers=JOB_INTERACTIVE_WORKERS)
+    for state in ACTIVE_STATES:
+        metrics.register_gauge(f"jobs.{state}", lambda state=state: jobs.counts()[state])
+    return jobs
+
+def render_panel(title, text):
+    st.subheader(title)
+    st.info(text)
+
+# Jalankan summarize/modul sebagai job; permintaan ulang untuk audio yang sama ikut job yang sudah berjalan.
+# Job memegang lease spool sendiri: file tidak dihapus walau sesi ganti audio atau berakhir di tengah job.
+def start_audio_job(job_key, kind, fn, audio_path):
+    audio_hash = file_sha256(audio_path)
+    spool = get_spool()
+    lease = spool.lease()
+    spool.hold(audio_path, lease)
+
+    def run(progress):
+        try:
+            return fn(audio_path, progress)
+        finally:
+            spool.release_all(lease.id)
+
+    st.session_state[job_key] = get_jobs().submit(kind, audio_hash, run)
+
+# Pantau job sesi ini; teks parsial ditampilkan sebagai progres, hasil disimpan ke session_state saat selesai
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def poll_job(job_key, title, result_key, show_progress=True, next_page=None):
+    job_id = st.session_state.get(job_key)
+    job = get_jobs().get(job_id) if job_id else None
+    if job is None:
+        st.session_state.pop(job_key, None)
+        return
+
+    if job['state'] in ('queued', 'running'):
+        if show_progress and job['progress']:
+            render_panel(title, job['progress'])
+        elif job['state'] == 'queued':
+            st.info(f"{title}: menunggu antrian...")
+        else:
+            st.info(f"{title}: sedang diproses...")
+        return
+
+    del st.session_state[job_key]
+    if job['state'] == 'success':
+        st.session_state[result_key] = job['result']
+        if next_page:
+            st.session_state.current_page = next_page
+    else:
+        st.session_state[f"{job_key}_error"] = job['error']
+    st.rerun()
+
+# Tampilkan job yang berjalan atau error job terakhir
+def show_job(job_key, title, result_key, show_progress=True, next_page=None):
+    error = st.session_state.pop(f"{job_key}_error", None)
+    if error:
+        st.error(f"Gagal membuat {title.lower()}: {error}")
+    if st.session_state.get(job_key):
+        poll_job(job_key, title, result_key, show_progress, next_page)
+        return True
+    return False
+
 def render_audio_to_materi():
     st.title("Audio to Materi")
     st.write("Upload rekaman audio untuk diubah menjadi ringkasan dan modul")
@@ -273,16 +746,17 @@ def render_audio_to_materi():
     if st.session_state.get('from_recording', False) and 'selected_audio_file' in st.session_state:
         try:
             selected_audio_file = st.session_state['selected_audio_file']
-            audio_url = f"{FLASK_SERVER_URL}/uploads/{selected_audio_file}"
-            audio_content = requests.get(audio_url).content
+            # Varian terkompresi lebih kecil dan didekode lokal untuk VAD dan segmen;
+            # WAV asli hanya diambil jika ffmpeg tidak ada di sini tetapi VAD atau segmen dibutuhkan
+            estimated_seconds = st.session_state.get('selected_audio_size', 0) / WAV_BYTES_PER_SECOND
+            need_wav = not ffmpeg_available() and (vad.VAD_ENABLED or estimated_seconds > LONG_AUDIO_SECONDS)
+            audio_path = local_recording_path(selected_audio_file, need_wav)
+            if audio_path is None:
+                audio_path = download_recording(selected_audio_file, need_wav)
 
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.' + selected_audio_file.split('.')[-1]) as tmp_file:
-                tmp_file.write(audio_content)
-                audio_path = tmp_file.name
-
-            st.session_state['audio_path'] = audio_path
+            set_audio_path(audio_path)
             st.session_state['audio_filename'] = selected_audio_file
-            st.audio(audio_url)
+            st.audio(f"{FLASK_SERVER_URL}/stream/{selected_audio_file}")
             st.success(f"Berhasil memuat audio: {selected_audio_file}")
             st.session_state['from_recording'] = False
 
@@ -293,9 +767,17 @@ def render_audio_to_materi():
     else:
         uploaded_file = st.file_uploader("Upload penjelasan materi", type=['wav', 'mp3'])
         if uploaded_file is not None:
-            audio_path = save_uploaded_file(uploaded_file)
+            # File yang sama tidak ditulis ulang pada setiap rerun; nama dan ukuran saja tidak cukup
+            # karena WAV dengan nama dan durasi sama berukuran sama
+            upload_key = uploaded_file.file_id
+            spooled_key, spooled_path = st.session_state.get('spooled_upload', (None, None))
+            if spooled_key == upload_key and os.path.exists(spooled_path):
+                audio_path = spooled_path
+            else:
+                audio_path = save_uploaded_file(uploaded_file)
+                st.session_state['spooled_upload'] = (upload_key, audio_path)
             if audio_path:
-                st.session_state['audio_path'] = audio_path
+                set_audio_path(audio_path)
                 st.session_state['audio_filename'] = uploaded_file.name
                 st.audio(audio_path)
 
@@ -308,26 +790,39 @@ def render_audio_to_materi():
         st.markdown(f"**File saat ini:** `{st.session_state['audio_filename']}`")
 
     # Tombol Summarize
+    run_all = False
+    summarize_clicked = False
+    streaming = False
     if audio_path:
-        if st.button('Summarize audio'):
-            with st.spinner('Merangkum Materi...'):
-                summary = summarize(audio_path)
-                st.session_state['summary'] = summary
-                st.session_state['tampilkan_tombol_modul'] = True
+        streaming = st.checkbox("Tampilkan hasil secara streaming", value=True)
+        summarize_clicked = st.button('Summarize audio')
+        run_all = st.button('Proses Semua (Ringkasan + Modul)')
+
+    # Ringkasan dan modul berjalan sebagai job di background; Proses Semua menjalankan keduanya bersamaan
+    if summarize_clicked or run_all:
+        st.session_state.pop('summary', None)
+        start_audio_job('summary_job', 'summarize', summarize, audio_path)
+    if run_all:
+        st.session_state.pop('modul_text', None)
+        start_audio_job('modul_job', 'modul', modul, audio_path)
 
     # Menampilkan ringkasan
-    if 'summary' in st.session_state:
-        st.subheader("Ringkasan")
-        st.info(st.session_state['summary'])
+    if not show_job('summary_job', "Ringkasan", 'summary', streaming) and 'summary' in st.session_state:
+        st.session_state['tampilkan_tombol_modul'] = True
+        render_panel("Ringkasan", st.session_state['summary'])
+        pdf_download('summary', 'text', {'title': "Ringkasan Materi", 'text': st.session_state['summary']},
+                     "ringkasan.pdf", "PDF Ringkasan")
 
     # Tombol dan output Modul
-    if st.session_state.get('tampilkan_tombol_modul', False):
+    if st.session_state.get('tampilkan_tombol_modul', False) and not st.session_state.get('modul_job'):
         if st.button('Buat Modul'):
-            with st.spinner('Membuat Modul...'):
-                modul_text = modul(audio_path)
-                st.session_state['modul_text'] = modul_text
-                st.subheader("Modul")
-                st.info(modul_text)
+            st.session_state.pop('modul_text', None)
+            start_audio_job('modul_job', 'modul', modul, audio_path)
+
+    if not show_job('modul_job', "Modul", 'modul_text', streaming) and 'modul_text' in st.session_state:
+        render_panel("Modul", st.session_state['modul_text'])
+        pdf_download('modul', 'text', {'title': "Modul Pembelajaran", 'text': st.session_state['modul_text']},
+                     "modul.pdf", "PDF Modul")
 
     # Tombol ke Quiz Generator
     if 'modul_text' in st.session_state:
@@ -350,42 +845,35 @@ def render_quiz_generator():
     else:
         user_material = st.text_area("**Materi:**", height=200, placeholder="Paste teks materi di sini...")
     
-    difficulty = st.selectbox("**Tingkat Kesulitan:**", ["Easy", "Medium", "Hard"])
+    difficulty = st.selectbox("**Tingkat Kesulitan:**", QUIZ_DIFFICULTIES)
     num_questions = st.slider("**Jumlah Soal:**", 1, 10, 5)
     
-    if st.button("Generate Quiz") and user_material:
-        with st.spinner("Membuat kuis..."):
-            try:
-                quiz_data = generate_quiz(user_material, difficulty, num_questions)
-                
-                # Buat kode quiz unik
-                quiz_code = create_quiz_code()
-                
-                # Simpan quiz dalam session state
-                st.session_state.quizzes[quiz_code] = {
-                    "data": quiz_data,
-                    "material": user_material,
-                    "difficulty": difficulty,
-                    "num_questions": num_questions,
-                    "created_at": time.strftime("%Y-%m-%d %H:%M:%S")
-                }
-                
-                st.session_state.current_quiz = quiz_code
-                st.session_state.current_page = 'view_quiz'
-                st.success("Quiz berhasil dibuat!")
-                st.rerun()
-            except Exception as e:
-                st.error(f"Error: {str(e)}\n\nCoba generate lagi.")
+    material_hash = hashlib.sha256(user_material.encode('utf-8')).hexdigest() if user_material else None
+    if material_hash:
+        bank = get_question_bank()
+        pool_size = bank.count(material_hash, difficulty)
+        filling = " (sedang menambah soal...)" if bank.is_filling(material_hash, difficulty) else ""
+        st.caption(f"Bank soal {difficulty}: {pool_size} soal{filling}")
+    
+    if st.button("Generate Quiz", disabled=bool(st.session_state.get('quiz_job'))) and user_material:
+        bank = get_question_bank()
+        store = get_quiz_store()
+        st.session_state.quiz_job = get_jobs().submit(
+            'quiz', f"{material_hash}:{difficulty}:{num_questions}",
+            lambda progress: build_quiz(bank, store, user_material, material_hash, difficulty, num_questions),
+            interactive=True
+        )
+    
+    show_job('quiz_job', "Quiz", 'current_quiz', next_page='view_quiz')
 
 # Halaman View Quiz (Tampilan Guru)
 def render_view_quiz():
-    if 'current_quiz' not in st.session_state or st.session_state.current_quiz not in st.session_state.quizzes:
+    quiz_code = st.session_state.get('current_quiz')
+    quiz_data = get_quiz_store().get(quiz_code) if quiz_code else None
+    if quiz_data is None:
         st.error("Quiz tidak ditemukan!")
         return
     
-    quiz_code = st.session_state.current_quiz
-    quiz_data = st.session_state.quizzes[quiz_code]
-    
     st.title(f"Quiz - Kode: {quiz_code}")
     st.write(f"**Tingkat Kesulitan:** {quiz_data['difficulty']}")
     st.write(f"**Jumlah Soal:** {quiz_data['num_questions']}")
@@ -404,6 +892,18 @@ def render_view_quiz():
             st.write(f"**Jawaban Benar:** {q['correct_answer'].upper()}")
             st.write(f"**Penjelasan:** {q.get('explanation', 'Tidak ada penjelasan')}")
     
+    # Lembar soal dan kunci jawaban untuk dicetak
+    st.divider()
+    st.subheader("Cetak Quiz")
+    col1, col2 = st.columns(2)
+    with col1:
+        pdf_download(f"quiz_{quiz_code}", 'quiz', {'title': f"Quiz {quiz_code}", 'quiz': quiz_data['data']},
+                     f"quiz_{quiz_code}.pdf", "PDF Soal")
+    with col2:
+        pdf_download(f"answers_{quiz_code}", 'quiz',
+                     {'title': f"Kunci Jawaban Quiz {quiz_code}", 'quiz': quiz_data['data'], 'answer_key': True},
+                     f"kunci_{quiz_code}.pdf", "PDF Kunci Jawaban")
+    
     # Tombol untuk bagikan quiz ke siswa
     st.divider()
     st.subheader("Bagikan Quiz ke Siswa")
@@ -419,11 +919,17 @@ def render_view_quiz():
 def render_quiz_list():
     st.title("Daftar Quiz")
     
-    if not st.session_state.quizzes:
+    store = get_quiz_store()
+    total = store.count()
+    if not total:
         st.info("Belum ada quiz yang dibuat.")
         return
     
-    for code, quiz in st.session_state.quizzes.items():
+    page_count = (total + QUIZ_LIST_PAGE_SIZE - 1) // QUIZ_LIST_PAGE_SIZE
+    page = min(st.session_state.quiz_list_page, page_count - 1)
+    
+    for quiz in store.list(page * QUIZ_LIST_PAGE_SIZE, QUIZ_LIST_PAGE_SIZE):
+        code = quiz['code']
         with st.expander(f"Quiz {code} - {quiz['created_at']}"):
             st.write(f"**Tingkat Kesulitan:** {quiz['difficulty']}")
             st.write(f"**Jumlah Soal:** {quiz['num_questions']}")
@@ -432,6 +938,20 @@ def render_quiz_list():
                 st.session_state.current_quiz = code
                 st.session_state.current_page = 'view_quiz'
                 st.rerun()
+    
+    # Navigasi halaman
+    if page_count > 1:
+        nav_col1, nav_col2, nav_col3 = st.columns([1, 2, 1])
+        with nav_col1:
+            if st.button("◀ Sebelumnya", disabled=page == 0):
+                st.session_state.quiz_list_page = page - 1
+                st.rerun()
+        with nav_col2:
+            st.write(f"Halaman {page + 1} dari {page_count} ({total} quiz)")
+        with nav_col3:
+            if st.button("Berikutnya ▶", disabled=page + 1 >= page_count):
+                st.session_state.quiz_list_page = page + 1
+                st.rerun()
 
 # Halaman Take Quiz (Siswa)
 def render_take_quiz():
@@ -441,11 +961,12 @@ def render_take_quiz():
     quiz_code = st.text_input("Masukkan Kode Quiz:")
     
     if quiz_code:
-        if quiz_code not in st.session_state.quizzes:
+        quiz = get_quiz_store().get(quiz_code)
+        if quiz is None:
             st.error("Kode quiz tidak valid!")
             return
         
-        quiz_data = st.session_state.quizzes[quiz_code]['data']
+        quiz_data = shuffle_variant(quiz['data'], f"{st.session_state.variant_seed}-{quiz_code}")
         
         # Inisialisasi jawaban siswa jika belum ada
         if 'student_answers' not in st.session_state:
@@ -483,7 +1004,7 @@ def render_take_quiz():
 
 # Tampilkan hasil quiz
 def render_quiz_results(quiz_code):
-    quiz_data = st.session_state.quizzes[quiz_code]['data']
+    quiz_data = shuffle_variant(get_quiz_store().get(quiz_code)['data'], f"{st.session_state.variant_seed}-{quiz_code}")
     student_answers = st.session_state.student_answers[quiz_code]
     
     st.divider()
@@ -516,6 +1037,81 @@ def render_quiz_results(quiz_code):
         st.session_state.current_quiz_check = None
         st.rerun()
 
+# Halaman Diagnostik
+# Satu trace sebagai pohon teks: nama span, durasi, atribut
+def trace_lines(node, depth=0):
+    seconds = "berjalan" if node['seconds'] is None else f"{node['seconds']:.3f}s"
+    error = f" [{node['error']}]" if node['error'] else ""
+    attrs = " ".join(f"{key}={value}" for key, value in node['attrs'].items())
+    lines = [f"{'  ' * depth}{node['name']}  {seconds}{error}  {attrs}".rstrip()]
+    for child in node['children']:
+        lines += trace_lines(child, depth + 1)
+    return lines
+
+# Tampilkan snapshot metrics (dari proses ini atau dari /metrics server Flask)
+def render_metrics(snapshot):
+    gauges = {name: value for name, value in snapshot['gauges'].items() if value is not None}
+    if gauges:
+        columns = st.columns(min(len(gauges), 4))
+        for i, (name, value) in enumerate(gauges.items()):
+            columns[i % len(columns)].metric(name, value)
+
+    st.subheader("Waktu per Tahap")
+    if snapshot['spans']:
+        st.dataframe([{
+            'tahap': name,
+            'jumlah': span['count'],
+            'aktif': span['active'],
+            'error': span['errors'],
+            'p50 (s)': round(span['p50_seconds'], 3),
+            'p95 (s)': round(span['p95_seconds'], 3),
+            'maks (s)': round(span['max_seconds'], 3),
+            'total (s)': round(span['total_seconds'], 3)
+        } for name, span in snapshot['spans'].items()], hide_index=True)
+    else:
+        st.caption("Belum ada data")
+
+    if snapshot['tokens']:
+        st.subheader("Pemakaian Token")
+        st.dataframe([{'operasi': operation, **fields} for operation, fields in snapshot['tokens'].items()],
+                     hide_index=True)
+    if snapshot['counters']:
+        st.subheader("Counter")
+        st.dataframe([{'nama': name, 'nilai': value} for name, value in snapshot['counters'].items()],
+                     hide_index=True)
+
+    if snapshot['traces']:
+        st.subheader("Trace Terakhir")
+        for trace in snapshot['traces'][:DIAGNOSTICS_TRACES]:
+            with st.expander(f"{trace['name']} - {trace['seconds']:.2f}s"):
+                st.code("\n".join(trace_lines(trace)), language=None)
+    if snapshot['log']:
+        with st.expander("Log"):
+            st.code("\n".join(reversed(snapshot['log'])), language=None)
+
+def render_diagnostics():
+    st.title("Diagnostik")
+    st.write("Waktu tiap tahap, pemakaian token, dan job yang sedang berjalan")
+    if st.button("🔄 Muat Ulang"):
+        st.rerun()
+    # Gauge job baru terdaftar setelah antrian dibuat
+    get_jobs()
+
+    app_tab, server_tab = st.tabs(["Aplikasi", "Server Flask"])
+    with app_tab:
+        timings = startup_timings()
+        if timings:
+            st.caption("Startup: " + ", ".join(f"{page} {seconds:.2f}s" for page, seconds in timings.items()))
+        render_metrics(metrics.snapshot())
+    with server_tab:
+        import httpclient
+        try:
+            response = httpclient.get(f"{FLASK_SERVER_URL}/metrics")
+            response.raise_for_status()
+            render_metrics(response.json())
+        except Exception as e:
+            st.warning(f"Metrics server tidak dapat diambil: {e}")
+
 # Main App
 def main():
     render_sidebar()
@@ -533,7 +1129,24 @@ def main():
     elif st.session_state.current_page == 'take_quiz':
         render_take_quiz()
     elif st.session_state.current_page == 'microfon':  # tambahkan ini
+        # Halaman perekam (pandas, requests, poller ESP32) baru dimuat saat dibuka
+        from iotrecorder import microfon
         microfon()
+    elif st.session_state.current_page == 'diagnostics':
+        render_diagnostics()
+
+# Waktu render pertama tiap halaman di proses ini; import berat per halaman terjadi di run pertama
+@st.cache_resource
+def startup_timings():
+    return {}
+
+def record_startup(page, seconds):
+    timings = startup_timings()
+    if page not in timings:
+        timings[page] = seconds
+        metrics.observe('startup', seconds)
+        metrics.log(f"Startup {page}: {seconds:.3f}s")
 
 if __name__ == "__main__":
     main()
+    record_startup(st.session_state.current_page, time.perf_counter() - SCRIPT_STARTED)
@@ -0,0 +1,89 @@
+import threading
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+# Jumlah frame yang disalin per iterasi saat memotong segmen
+BLOCK_FRAMES = 64 * 1024
+
+_stage_locks = {}
+_stage_locks_lock = threading.Lock()
+
+
+def wav_duration(path):
+    """
+    Durasi file WAV dalam detik, None jika bukan WAV yang bisa dibaca
+    """
+    try:
+        with wave.open(path, 'rb') as src:
+            return src.getnframes() / float(src.getframerate())
+    except (wave.Error, EOFError):
+        return None
+
+
+def plan_segments(path, segment_seconds, overlap_seconds):
+    """
+    Bagi rekaman menjadi segmen waktu yang saling tumpang tindih.
+    Hanya membaca header WAV; sampel baru disalin saat write_segment dipanggil.
+    """
+    with wave.open(path, 'rb') as src:
+        rate = src.getframerate()
+        total_frames = src.getnframes()
+
+    segment_frames = int(segment_seconds * rate)
+    step_frames = max(segment_frames - int(overlap_seconds * rate), 1)
+
+    segments = []
+    start_frame = 0
+    while start_frame < total_frames:
+        frames = min(segment_frames, total_frames - start_frame)
+        segments.append({
+            'index': len(segments),
+            'start_frame': start_frame,
+            'frames': frames,
+            'start': start_frame / float(rate),
+            'end': (start_frame + frames) / float(rate)
+        })
+        if start_frame + frames >= total_frames:
+            break
+        start_frame += step_frames
+
+    return segments
+
+
+def write_segment(path, segment, out_path):
+    """
+    Salin satu segmen dari buffer sampel ke file WAV baru, per blok agar memori tetap kecil
+    """
+    with wave.open(path, 'rb') as src, wave.open(out_path, 'wb') as dst:
+        dst.setparams(src.getparams())
+        src.setpos(segment['start_frame'])
+        remaining = segment['frames']
+        while remaining > 0:
+            block = src.readframes(min(BLOCK_FRAMES, remaining))
+            if not block:
+                break
+            dst.writeframes(block)
+            remaining -= min(BLOCK_FRAMES, remaining)
+    return out_path
+
+
+def map_segments(segments, map_fn, max_workers=4):
+    """
+    Jalankan map_fn untuk tiap segmen secara paralel (maksimal max_workers sekaligus),
+    hasil dikembalikan sesuai urutan segmen
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(map_fn, segments))
+
+
+def stage_lock(key):
+    """
+    Lock per kunci agar tahap map untuk rekaman yang sama tidak dijalankan dua kali bersamaan
+    """
+    with _stage_locks_lock:
+        return _stage_locks.setdefault(key, threading.Lock())
+
+
+def format_timestamp(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
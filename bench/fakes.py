@@ -0,0 +1,272 @@
+"""
+Local stand-ins for the external services: a fake google.generativeai backend,
+a fake ESP32 HTTP API and synthetic WAV recordings.
+"""
+import json
+import math
+import os
+import random
+import struct
+import threading
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+
+def make_wav(path, seconds, rate=16000, seed=0, block_frames=64 * 1024):
+    """
+    16 kHz / 16-bit mono WAV like the ESP32 firmware writes, generated blockwise.
+    A different seed gives different content (and a different hash).
+    """
+    rng = random.Random(seed)
+    tone = 200 + rng.random() * 400
+    total = int(seconds * rate)
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        for start in range(0, total, block_frames):
+            frames = min(block_frames, total - start)
+            samples = (int(8000 * math.sin(2 * math.pi * tone * (start + i) / rate)) for i in range(frames))
+            wav.writeframes(struct.pack(f"<{frames}h", *samples))
+    return path
+
+
+def lorem(words, seed=0):
+    rng = random.Random(seed)
+    vocabulary = ("materi pelajaran siswa guru energi proses contoh penjelasan konsep rumus "
+                  "fotosintesis sel atom reaksi gaya gerak waktu data hasil").split()
+    return " ".join(rng.choice(vocabulary) for _ in range(words))
+
+
+def quiz_payload(num_questions, seed=0):
+    """
+    Valid quiz JSON as returned by structured output
+    """
+    rng = random.Random(seed)
+    questions = []
+    for i in range(num_questions):
+        options = {key: f"Opsi {key} {i} {lorem(6, seed + i * 4 + n)}" for n, key in enumerate('abcd')}
+        answer = rng.choice('abcd')
+        questions.append({
+            'question': f"Pertanyaan {i + 1}: {lorem(18, seed + i)}?",
+            'options': options,
+            'correct_answer': answer,
+            'correct_text': options[answer],
+            'explanation': lorem(30, seed + i + 7)
+        })
+    return json.dumps({'quiz': questions}, ensure_ascii=False)
+
+
+class FakeResponse:
+    def __init__(self, text, prompt_tokens, chunks=None):
+        self.text = text
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=len(text) // 4,
+            total_token_count=prompt_tokens + len(text) // 4
+        )
+        self.candidates = [SimpleNamespace(finish_reason=SimpleNamespace(name='STOP'))]
+        self._chunks = chunks
+
+    def __iter__(self):
+        for chunk in self._chunks or [self.text]:
+            yield SimpleNamespace(text=chunk)
+
+
+class FakeGenerativeModel:
+    def __init__(self, backend, model_name, generation_config=None):
+        self.backend = backend
+        self.model_name = model_name
+        self.generation_config = generation_config or {}
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        backend = self.backend
+        with backend.lock:
+            backend.calls += 1
+        structured = 'response_schema' in self.generation_config
+        text = backend.payload(contents, structured)
+        if not stream:
+            time.sleep(backend.latency)
+            return FakeResponse(text, backend.prompt_tokens)
+        # First token after the latency, then the rest spread over stream_seconds
+        time.sleep(backend.latency)
+        pieces = [text[i:i + backend.chunk_chars] for i in range(0, len(text), backend.chunk_chars)]
+        delay = backend.stream_seconds / max(len(pieces), 1)
+
+        def chunks():
+            for piece in pieces:
+                time.sleep(delay)
+                yield piece
+        return FakeResponse(text, backend.prompt_tokens, chunks())
+
+
+class FakeGenAI:
+    """
+    Drop-in for the google.generativeai calls the app makes (configure, upload_file,
+    GenerativeModel.generate_content) with configurable latency and payloads.
+    """
+
+    def __init__(self, latency=0.5, upload_latency=0.2, stream_seconds=1.0, chunk_chars=200,
+                 text_words=800, quiz_questions=None, prompt_tokens=2000):
+        self.latency = latency
+        self.upload_latency = upload_latency
+        self.stream_seconds = stream_seconds
+        self.chunk_chars = chunk_chars
+        self.text_words = text_words
+        self.quiz_questions = quiz_questions
+        self.prompt_tokens = prompt_tokens
+        self.calls = 0
+        self.uploads = 0
+        self.lock = threading.Lock()
+
+    def configure(self, **kwargs):
+        pass
+
+    def upload_file(self, path, **kwargs):
+        time.sleep(self.upload_latency)
+        with self.lock:
+            self.uploads += 1
+        return SimpleNamespace(name=f"files/{os.path.basename(path)}", uri=path, expiration_time=None)
+
+    def GenerativeModel(self, model_name, generation_config=None, **kwargs):
+        return FakeGenerativeModel(self, model_name, generation_config)
+
+    def payload(self, contents, structured):
+        if structured or self.quiz_questions:
+            return quiz_payload(self.quiz_questions or 10)
+        return "# Modul\n\n" + "\n".join(f"* {lorem(20, i)}" for i in range(self.text_words // 20))
+
+
+def install_fake_genai(fake):
+    """
+    Make models.client() (and everything built on it) use the fake backend
+    """
+    import models
+    with models._lock:
+        models._genai = fake
+        models._models.clear()
+    return fake
+
+
+class _ESP32Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        device = self.server.device
+        time.sleep(device.latency)
+        if self.path.startswith('/status'):
+            status = {
+                'isRecording': device.recording,
+                'sdCardOK': True,
+                'microphoneOK': True,
+                'wifiConnected': True,
+                'currentFilename': device.last_file or ''
+            }
+            if device.recording:
+                status['recordingTime'] = int(time.time() - device.started)
+            elif device.recorded_seconds:
+                status['lastRecordingDuration'] = int(device.recorded_seconds)
+            self._reply(status)
+        else:
+            self._reply({'status': 'error', 'message': 'Not found'}, 404)
+
+    def do_POST(self):
+        device = self.server.device
+        length = int(self.headers.get('Content-Length', 0))
+        if length:
+            self.rfile.read(length)
+        time.sleep(device.latency)
+        command = self.path.strip('/')
+        if command == 'start':
+            if device.recording:
+                self._reply({'status': 'error', 'message': 'Already recording'}, 400)
+                return
+            device.recording = True
+            device.started = time.time()
+            device.counter += 1
+            device.last_file = f"/bench_{device.counter}.wav"
+            self._reply({'status': 'success', 'message': 'Recording started', 'filename': device.last_file})
+        elif command == 'stop':
+            if not device.recording:
+                self._reply({'status': 'error', 'message': 'Not currently recording'}, 400)
+                return
+            device.recording = False
+            device.recorded_seconds = time.time() - device.started
+            self._reply({'status': 'success', 'message': 'Recording stopped', 'filename': device.last_file,
+                         'duration': int(device.recorded_seconds)})
+        elif command == 'upload':
+            if not device.last_file:
+                self._reply({'status': 'error', 'message': 'No recording available to upload'}, 400)
+                return
+            self._reply({'status': 'success', 'message': 'Upload started', 'filename': device.last_file})
+            threading.Thread(target=device.upload, daemon=True).start()
+        elif command == 'test':
+            self._reply({'status': 'success', 'sdCardOK': True, 'microphoneOK': True, 'wifiConnected': True})
+        else:
+            self._reply({'status': 'error', 'message': 'Unknown command'}, 404)
+
+
+class FakeESP32:
+    """
+    HTTP API of the recorder firmware (/status, /start, /stop, /upload, /test).
+    /upload posts a synthetic WAV of `upload_seconds` to the Flask server in the background.
+    """
+
+    def __init__(self, flask_url=None, latency=0.05, upload_seconds=60, workdir='.'):
+        self.flask_url = flask_url
+        self.latency = latency
+        self.upload_seconds = upload_seconds
+        self.workdir = workdir
+        self.recording = False
+        self.started = None
+        self.recorded_seconds = 0
+        self.counter = 0
+        self.last_file = None
+        self.prepared = None
+        self.uploaded = threading.Event()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _ESP32Handler)
+        self._server.device = self
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def prepare(self, seconds):
+        """
+        Generate the next recording ahead of time so benchmarks do not time WAV synthesis
+        """
+        self.prepared = make_wav(os.path.join(self.workdir, f"prepared_{self.counter + 1}.wav"),
+                                 seconds, seed=self.counter + 1)
+
+    def upload(self):
+        import httpclient
+        name = self.last_file.lstrip('/')
+        path, self.prepared = self.prepared, None
+        if path is None:
+            path = make_wav(os.path.join(self.workdir, name), self.upload_seconds, seed=self.counter)
+        with open(path, 'rb') as f:
+            httpclient.post(f"{self.flask_url}/upload", data=f,
+                            headers={'Content-Disposition': f'attachment; filename="{name}"'})
+        os.remove(path)
+        self.uploaded.set()
@@ -0,0 +1,84 @@
+"""
+Helpers shared by the benchmarks: loading the repo's Flask server in-process,
+serving it over HTTP on a free port, and summarising timings.
+"""
+import importlib.util
+import os
+import resource
+import statistics
+import sys
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Appended, not prepended: the repo's flask.py must not shadow the real flask package
+if REPO_ROOT not in sys.path:
+    sys.path.append(REPO_ROOT)
+
+
+def load_server(workdir):
+    """
+    Import flask.py as a separate module with its uploads/ folder inside workdir.
+    The server resolves uploads/ relative to the working directory, so this chdirs.
+    """
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    spec = importlib.util.spec_from_file_location('smartnote_server', os.path.join(REPO_ROOT, 'flask.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class HTTPServer:
+    """
+    Serve a WSGI app on 127.0.0.1 with a free port in a background thread
+    """
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+        self._server = make_server('127.0.0.1', 0, app, threaded=True)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+
+
+def summarize(samples):
+    """
+    Latency summary in milliseconds
+    """
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return ordered[min(int(round(p / 100 * (len(ordered) - 1))), len(ordered) - 1)] * 1000
+
+    return {
+        'count': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'max_ms': ordered[-1] * 1000
+    }
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def max_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
@@ -0,0 +1,310 @@
+"""
+Offline benchmarks for the hot paths, using local stand-ins for Gemini, the Flask server
+and the ESP32. Run from the repo root:
+
+    python bench/run.py [--quick] [--only upload,files,quiz,e2e] [--output FILE] [--baseline FILE]
+
+Results are written as JSON. With --baseline, timings that got slower (or throughput
+that dropped) by more than --tolerance are reported and the exit status is 1.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# The fake backend has no quota; set before the app modules read their configuration
+os.environ.setdefault('GEMINI_RPM', '100000')
+os.environ.setdefault('GEMINI_TPM', '1000000000')
+# Keep the server's background sweeper from touching other benchmarks' folders
+os.environ.setdefault('SWEEP_INTERVAL_SECONDS', '86400')
+
+from harness import REPO_ROOT, HTTPServer, load_server, max_rss_mb, summarize, timed
+from fakes import FakeESP32, FakeGenAI, install_fake_genai, make_wav, quiz_payload
+
+WAV_BYTES_PER_SECOND = 16000 * 2
+
+
+def bench_upload(workdir, sizes_mb):
+    """
+    POST /upload over HTTP: throughput, and Python heap peak while a large WAV streams in
+    """
+    server = load_server(workdir)
+    import httpclient
+    runs = []
+    with HTTPServer(server.app) as http:
+        for size_mb in sizes_mb:
+            name = f"upload_{size_mb}mb.wav"
+            path = make_wav(os.path.join(workdir, name), size_mb * 1024 * 1024 / WAV_BYTES_PER_SECOND, seed=size_mb)
+            size = os.path.getsize(path)
+
+            def post():
+                with open(path, 'rb') as f:
+                    response = httpclient.post(f"{http.url}/upload", data=f, timeout=(3, 600),
+                                               headers={'Content-Disposition': f'attachment; filename="{name}"'})
+                response.raise_for_status()
+
+            seconds = timed(post, 1)[0]
+            # Separate traced pass: tracemalloc slows the request down
+            tracemalloc.start()
+            post()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            os.remove(path)
+            runs.append({
+                'size_mb': size / 2 ** 20,
+                'seconds': seconds,
+                'throughput_mb_s': size / 2 ** 20 / seconds,
+                'python_peak_mb': peak / 2 ** 20
+            })
+    return {'runs': runs, 'max_rss_mb': max_rss_mb()}
+
+
+def bench_files(workdir, count, repeat):
+    """
+    GET /files latency on a catalog with `count` recordings, plus 304 revalidation
+    """
+    uploads = os.path.join(workdir, 'uploads')
+    os.makedirs(uploads, exist_ok=True)
+    template = make_wav(os.path.join(workdir, 'template.wav'), 0.1)
+    now = time.time()
+    for i in range(count):
+        path = os.path.join(uploads, f"recording_{i:06d}.wav")
+        shutil.copyfile(template, path)
+        # Spread recordings over the last 90 days
+        mtime = now - (i % 90) * 86400 - i
+        os.utime(path, (mtime, mtime))
+
+    started = time.perf_counter()
+    server = load_server(workdir)
+    startup = time.perf_counter() - started
+    client = server.app.test_client()
+
+    since = datetime.date.fromtimestamp(now - 30 * 86400).isoformat()
+    until = datetime.date.fromtimestamp(now - 7 * 86400).isoformat()
+    queries = {
+        'first_page': '/files?limit=50',
+        'deep_page': f'/files?offset={max(count - 50, 0)}&limit=50',
+        'by_name': '/files?limit=50&sort=name&order=asc',
+        'by_size': '/files?limit=50&sort=size',
+        'date_range': f'/files?limit=50&since={since}&until={until}',
+        'max_page': '/files?limit=1000'
+    }
+    results = {}
+    for label, query in queries.items():
+        response = client.get(query)
+        assert response.status_code == 200, response.status_code
+        etag = response.headers['ETag']
+        results[label] = summarize(timed(lambda: client.get(query), repeat))
+        results[f"{label}_304"] = summarize(
+            timed(lambda: client.get(query, headers={'If-None-Match': etag}), repeat)
+        )
+    sweep = timed(server.catalog.sweep, 3)
+    return {'recordings': count, 'startup_seconds': startup, 'sweep': summarize(sweep), 'queries': results}
+
+
+def bench_quiz(sizes, repeat):
+    """
+    parse_quiz + find_invalid_questions on large model responses, structured and free text
+    """
+    from quizschema import find_invalid_questions, parse_quiz
+    results = {}
+    for num_questions in sizes:
+        structured = quiz_payload(num_questions, seed=num_questions)
+        free_text = f"Berikut quiz yang diminta:\n```json\n{structured}\n```\nSemoga membantu!"
+        for label, text in (('structured', structured), ('free_text', free_text)):
+            def parse_and_validate():
+                invalid = find_invalid_questions(parse_quiz(text)['quiz'])
+                assert not invalid, invalid
+            results[f"{label}_{num_questions}"] = {
+                'response_kb': len(text.encode('utf-8')) / 1024,
+                **summarize(timed(parse_and_validate, repeat))
+            }
+    return results
+
+
+def bench_e2e(workdir, durations, latency):
+    """
+    Recording on the fake ESP32 -> upload to Flask -> fetch -> modul() with the fake Gemini backend
+    """
+    # Small thresholds so the segmented (map/reduce) path is exercised without hour-long files
+    os.environ.setdefault('LONG_AUDIO_SECONDS', '120')
+    os.environ.setdefault('SEGMENT_SECONDS', '60')
+    os.environ.setdefault('SEGMENT_OVERLAP_SECONDS', '5')
+    fake = install_fake_genai(FakeGenAI(latency=latency, upload_latency=latency / 2))
+    server = load_server(workdir)
+    try:
+        import streamlit.logger
+        # app.py runs outside `streamlit run`; its bare-mode warnings are noise here
+        streamlit.logger.set_log_level('error')
+        import app
+    except ImportError as e:
+        return {'skipped': f"app.py could not be imported: {e}"}
+    import httpclient
+
+    runs = []
+    with HTTPServer(server.app) as http:
+        device = FakeESP32(http.url, workdir=workdir).start()
+        try:
+            for seconds in durations:
+                device.upload_seconds = seconds
+                device.prepare(seconds)
+                device.uploaded.clear()
+                calls_before = fake.calls
+                stages = {}
+                started = time.perf_counter()
+
+                httpclient.post(f"{device.url}/start").raise_for_status()
+                name = httpclient.post(f"{device.url}/stop").json()['filename'].lstrip('/')
+                httpclient.post(f"{device.url}/upload").raise_for_status()
+                # Same confirmation the poller does: wait until the server lists the recording
+                deadline = time.time() + 600
+                while time.time() < deadline:
+                    files = httpclient.get(f"{http.url}/files", params={'limit': 20}).json()['files']
+                    if any(f['name'] == name for f in files):
+                        break
+                    time.sleep(0.05)
+                stages['device_to_server'] = time.perf_counter() - started
+
+                mark = time.perf_counter()
+                long_audio = seconds > app.LONG_AUDIO_SECONDS
+                params = {} if long_audio else {'variant': 'compressed'}
+                path = os.path.join(workdir, f"fetched_{name}")
+                with httpclient.get(f"{http.url}/uploads/{name}", params=params, stream=True) as response:
+                    response.raise_for_status()
+                    with open(path, 'wb') as f:
+                        for chunk in response.iter_content(1024 * 1024):
+                            f.write(chunk)
+                stages['fetch'] = time.perf_counter() - mark
+
+                mark = time.perf_counter()
+                app.modul(path)
+                stages['modul'] = time.perf_counter() - mark
+                mark = time.perf_counter()
+                app.modul(path)
+                stages['modul_cached'] = time.perf_counter() - mark
+
+                runs.append({
+                    'audio_seconds': seconds,
+                    'segmented': long_audio,
+                    'model_calls': fake.calls - calls_before,
+                    'total_seconds': sum(v for k, v in stages.items() if k != 'modul_cached'),
+                    **{f"{k}_seconds": v for k, v in stages.items()}
+                })
+                os.remove(path)
+        finally:
+            device.stop()
+    return {'model_latency_seconds': latency, 'runs': runs}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(value, prefix=''):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten(item, f"{prefix}{key}.")
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            yield from _flatten(item, f"{prefix}{i}.")
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix[:-1], value
+
+
+def compare(results, baseline, tolerance, noise_ms=1.0):
+    """
+    Metrics that regressed by more than `tolerance` (a fraction) against the baseline.
+    Median latencies and durations are compared; differences under noise_ms are ignored.
+    """
+    previous = dict(_flatten(baseline['results']))
+    regressions = []
+    for metric, value in _flatten(results):
+        old = previous.get(metric)
+        if not old:
+            continue
+        if metric.endswith('p50_ms'):
+            if value > old * (1 + tolerance) and value - old > noise_ms:
+                regressions.append((metric, old, value))
+        elif metric.endswith('seconds') and value > old * (1 + tolerance) and (value - old) * 1000 > noise_ms:
+            regressions.append((metric, old, value))
+        elif metric.endswith('throughput_mb_s') and value < old * (1 - tolerance):
+            regressions.append((metric, old, value))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='smaller inputs, for CI')
+    parser.add_argument('--only', default='upload,files,quiz,e2e', help='comma-separated benchmarks')
+    parser.add_argument('--output', help='results file (default bench/results/<timestamp>.json)')
+    parser.add_argument('--baseline', help='previous results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown vs baseline')
+    parser.add_argument('--model-latency', type=float, default=0.5, help='fake Gemini latency in seconds')
+    args = parser.parse_args()
+
+    selected = set(args.only.split(','))
+    quick = args.quick
+    root = tempfile.mkdtemp(prefix='smartclassroom-bench-')
+    os.environ.setdefault('RESULT_CACHE_DIR', os.path.join(root, 'cache'))
+    os.environ.setdefault('SPOOL_DIR', os.path.join(root, 'spool'))
+    os.environ.setdefault('VAD_CACHE_DIR', os.path.join(root, 'vad'))
+
+    results = {}
+    try:
+        if 'upload' in selected:
+            print("upload...", flush=True)
+            results['upload'] = bench_upload(os.path.join(root, 'upload'), [20] if quick else [50, 200, 500])
+        if 'files' in selected:
+            print("files...", flush=True)
+            results['files'] = bench_files(os.path.join(root, 'files'), 2000 if quick else 10000, 20 if quick else 100)
+        if 'quiz' in selected:
+            print("quiz...", flush=True)
+            results['quiz'] = bench_quiz([10, 100] if quick else [10, 100, 1000], 5 if quick else 20)
+        if 'e2e' in selected:
+            print("e2e...", flush=True)
+            results['e2e'] = bench_e2e(os.path.join(root, 'e2e'), [30, 150] if quick else [60, 300, 900],
+                                       args.model_latency)
+    finally:
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(root, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'quick': quick
+        },
+        'results': results
+    }
+    output = args.output or os.path.join(
+        REPO_ROOT, 'bench', 'results', f"{datetime.datetime.now():%Y%m%d_%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for metric, old, new in regressions:
+            print(f"REGRESSION {metric}: {old:.3f} -> {new:.3f}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+import os
+import time
+
+
+def touch(path):
+    """
+    Tandai file cache sebagai baru dipakai; mtime menjadi urutan LRU untuk evict()
+    """
+    os.utime(path)
+
+
+def scan(directory, suffix=None):
+    """
+    [(mtime, ukuran, path)] untuk file cache di directory.
+    File .part (masih ditulis) dilewati; suffix membatasi ke jenis file tertentu.
+    """
+    files = []
+    for name in os.listdir(directory):
+        if name.endswith('.part') or (suffix and not name.endswith(suffix)):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if os.path.isfile(path):
+            files.append((stat.st_mtime, stat.st_size, path))
+    return files
+
+
+def victims(files, max_bytes, min_age=0, keep=None):
+    """
+    Path yang harus dihapus, yang paling lama tidak dipakai lebih dulu, agar total ukuran
+    [(terakhir_dipakai, ukuran, path)] tidak melebihi max_bytes. File yang dipakai dalam
+    min_age detik terakhir atau yang keep(path) benar tidak ikut dihapus.
+    """
+    cutoff = time.time() - min_age
+    total = sum(size for _, size, _ in files)
+    selected = []
+    for last_used, size, path in sorted(files):
+        if total <= max_bytes or last_used > cutoff:
+            break
+        if keep is not None and keep(path):
+            continue
+        selected.append(path)
+        total -= size
+    return selected
+
+
+def evict(directory, max_bytes, suffix=None, min_age=0):
+    """
+    Hapus file LRU dari direktori cache sampai total ukurannya di bawah max_bytes
+    """
+    removed = []
+    for path in victims(scan(directory, suffix), max_bytes, min_age):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        removed.append(path)
+    return removed
@@ -0,0 +1,177 @@
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+from ingest import expire_sessions
+
+SORT_COLUMNS = ('name', 'size', 'modified')
+
+
+class RecordingCatalog:
+    """
+    Persistent metadata index of the recordings in the upload folder.
+    Updated on upload and delete so GET /files never has to scan the directory.
+    """
+
+    def __init__(self, upload_folder, db_path, variants=None, incoming_folder=None, incoming_max_age=24 * 60 * 60):
+        self.upload_folder = upload_folder
+        # Optional Transcoder; a recording whose original was retired is listed via its variant
+        self.variants = variants
+        # Optional folder of partial uploads; abandoned ones are removed after incoming_max_age seconds
+        self.incoming_folder = incoming_folder
+        self.incoming_max_age = incoming_max_age
+        # Kept outside upload_folder, which is served as-is by /uploads and /stream
+        self.db_path = db_path
+        self._sweeper = None
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._db() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS recordings (
+                    name TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    modified REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_recordings_modified ON recordings (modified)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)")
+
+    @contextmanager
+    def _db(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _bump_version(self, conn):
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    def version(self):
+        """
+        Counter that changes whenever the catalog changes; used to build ETags
+        """
+        with self._db() as conn:
+            return conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def add(self, name):
+        filepath = os.path.join(self.upload_folder, name)
+        if not os.path.isfile(filepath) and self.variants is not None:
+            filepath = self.variants.variant_path(name) or filepath
+        with self._db() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO recordings (name, size, modified) VALUES (?, ?, ?)",
+                (name, os.path.getsize(filepath), os.path.getmtime(filepath))
+            )
+            self._bump_version(conn)
+
+    def remove(self, name):
+        with self._db() as conn:
+            if conn.execute("DELETE FROM recordings WHERE name = ?", (name,)).rowcount:
+                self._bump_version(conn)
+
+    def list(self, offset=0, limit=100, sort='modified', order='desc', since=None, until=None):
+        """
+        Return (total, files) for one page, optionally filtered by modification date
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_COLUMNS)}")
+        direction = 'ASC' if order == 'asc' else 'DESC'
+
+        where = []
+        params = []
+        if since is not None:
+            where.append("modified >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("modified < ?")
+            params.append(until)
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+
+        with self._db() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM recordings {where_sql}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT name, size, modified FROM recordings {where_sql} "
+                f"ORDER BY {sort} {direction}, name ASC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+
+        files = [{
+            'name': name,
+            'size': size,
+            'modified': datetime.datetime.fromtimestamp(modified).strftime('%Y-%m-%d %H:%M:%S')
+        } for name, size, modified in rows]
+        return total, files
+
+    def _scan(self):
+        for entry in os.scandir(self.upload_folder):
+            if entry.name.startswith('.') or not entry.is_file():
+                continue
+            yield entry
+
+    def sweep(self):
+        """
+        Remove empty files and abandoned partial uploads, apply the original retention
+        policy and bring the index back in line with the folder
+        """
+        with metrics.span('catalog.sweep'):
+            self._sweep()
+
+    def _sweep(self):
+        if self.variants is not None:
+            self.variants.apply_retention()
+        if self.incoming_folder is not None:
+            for name in expire_sessions(self.incoming_folder, self.incoming_max_age):
+                metrics.log(f"Removed abandoned partial upload: {name}")
+
+        on_disk = {}
+        for entry in self._scan():
+            stat = entry.stat()
+            if stat.st_size == 0:
+                metrics.log(f"File kosong terdeteksi, menghapus: {entry.name}")
+                os.remove(entry.path)
+                continue
+            on_disk[entry.name] = (stat.st_size, stat.st_mtime)
+
+        if self.variants is not None:
+            for entry in os.scandir(self.variants.variant_folder):
+                name = self.variants.original_name(entry.name)
+                if name and name not in on_disk and entry.is_file():
+                    stat = entry.stat()
+                    on_disk[name] = (stat.st_size, stat.st_mtime)
+
+        with self._db() as conn:
+            indexed = {name: (size, modified) for name, size, modified in
+                       conn.execute("SELECT name, size, modified FROM recordings")}
+            stale = [(name,) for name in indexed if name not in on_disk]
+            changed = [(name, size, modified) for name, (size, modified) in on_disk.items()
+                       if indexed.get(name) != (size, modified)]
+            if stale or changed:
+                conn.executemany("DELETE FROM recordings WHERE name = ?", stale)
+                conn.executemany("INSERT OR REPLACE INTO recordings (name, size, modified) VALUES (?, ?, ?)", changed)
+                self._bump_version(conn)
+
+    def start_sweeper(self, interval=60):
+        """
+        Run sweep() periodically in a daemon thread
+        """
+        if self._sweeper is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sweep()
+                except Exception as e:
+                    metrics.log(f"Error during catalog sweep: {str(e)}")
+
+        self._sweeper = threading.Thread(target=run, name='catalog-sweeper', daemon=True)
+        self._sweeper.start()
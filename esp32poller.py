@@ -0,0 +1,177 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import httpclient
+
+# Per-command timeouts (seconds); /upload only acknowledges, the transfer itself runs on the device
+COMMAND_TIMEOUTS = {'start': 10, 'stop': 15, 'upload': 10, 'test': 30}
+# How long to wait for an uploaded recording to show up on the Flask server
+UPLOAD_CONFIRM_TIMEOUT = 15 * 60
+
+_pollers = {}
+_pollers_lock = threading.Lock()
+
+
+class DevicePoller:
+    """
+    Process-wide background poller for one ESP32. Status is fetched on a schedule
+    with a short timeout and exponential backoff while the device is unreachable;
+    Streamlit sessions only read the latest snapshot and never block on the device.
+    Commands run on a single worker so the device handles one request at a time.
+    """
+
+    def __init__(self, base_url, flask_url=None, interval=5, timeout=2, max_backoff=60):
+        self.base_url = base_url
+        self.flask_url = flask_url
+        self.interval = interval
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._commands = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='esp32-command')
+        self._snapshot = {
+            'status': None,
+            'ok': False,
+            'error': None,
+            'updated_at': None,
+            'checked_at': None,
+            'failures': 0
+        }
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._snapshot)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='esp32-poller', daemon=True)
+        self._thread.start()
+
+    def refresh(self):
+        """
+        Poll again as soon as possible instead of waiting for the next tick
+        """
+        self._wake.set()
+
+    def _poll(self):
+        try:
+            response = httpclient.get(f"{self.base_url}/status", timeout=self.timeout)
+            response.raise_for_status()
+            status = response.json()
+        except Exception as e:
+            with self._lock:
+                self._snapshot.update(ok=False, error=str(e), checked_at=time.time(),
+                                      failures=self._snapshot['failures'] + 1)
+            return False
+
+        with self._lock:
+            self._snapshot.update(status=status, ok=True, error=None, updated_at=time.time(),
+                                  checked_at=time.time(), failures=0)
+        return True
+
+    def _run(self):
+        while True:
+            self._poll()
+            failures = self.snapshot()['failures']
+            delay = min(self.interval * (2 ** failures), self.max_backoff) if failures else self.interval
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def submit(self, command, data=None, then=None):
+        """
+        Queue a device command and return its id. `then` names a follow-up command
+        that runs only if this one succeeds (e.g. stop -> upload).
+        """
+        command_id = uuid.uuid4().hex
+        with self._lock:
+            # Forget commands that finished more than an hour ago
+            expired = time.time() - 3600
+            for old_id in [i for i, c in self._commands.items() if c['finished_at'] and c['finished_at'] < expired]:
+                del self._commands[old_id]
+            self._commands[command_id] = {
+                'id': command_id,
+                'command': command,
+                'state': 'pending',
+                'result': None,
+                'error': None,
+                'next': None,
+                'submitted_at': time.time(),
+                'finished_at': None
+            }
+        self._executor.submit(self._execute, command_id, data, then)
+        return command_id
+
+    def command(self, command_id):
+        with self._lock:
+            entry = self._commands.get(command_id)
+            return dict(entry) if entry else None
+
+    def _update_command(self, command_id, **fields):
+        with self._lock:
+            self._commands[command_id].update(**fields)
+
+    def _execute(self, command_id, data, then):
+        command = self._commands[command_id]['command']
+        self._update_command(command_id, state='running')
+        try:
+            # The firmware's file counter restarts at 0 on boot, so the name alone may match an old recording
+            listed_before = self._listed_files() if command == 'upload' and self.flask_url else None
+            response = httpclient.post(f"{self.base_url}/{command}", json=data or {},
+                                       timeout=COMMAND_TIMEOUTS.get(command, 10))
+            result = response.json()
+            if response.status_code != 200 or result.get('status') != 'success':
+                raise RuntimeError(result.get('message', f"HTTP {response.status_code}"))
+            if command == 'upload' and self.flask_url:
+                self._wait_for_upload(command_id, result.get('filename', ''), listed_before)
+            self._update_command(command_id, state='success', result=result, finished_at=time.time())
+        except Exception as e:
+            self._update_command(command_id, state='failed', error=str(e), finished_at=time.time())
+            return
+        finally:
+            self.refresh()
+
+        if then:
+            self._update_command(command_id, next=self.submit(then))
+
+    def _listed_files(self):
+        """
+        {name: (size, modified)} of the most recent recordings on the server, {} if unreachable
+        """
+        try:
+            response = httpclient.get(f"{self.flask_url}/files",
+                                      params={'limit': 20, 'sort': 'modified', 'order': 'desc'})
+            return {f['name']: (f['size'], f['modified']) for f in response.json().get('files', [])}
+        except Exception:
+            return {}
+
+    def _wait_for_upload(self, command_id, filename, listed_before=None):
+        # The device acknowledges /upload before sending the file; done once the server lists
+        # it with a size or modification time different from before the upload was requested
+        filename = filename.lstrip('/')
+        previous = (listed_before or {}).get(filename)
+        self._update_command(command_id, state='uploading')
+        deadline = time.time() + UPLOAD_CONFIRM_TIMEOUT
+        while time.time() < deadline:
+            time.sleep(2)
+            entry = self._listed_files().get(filename)
+            if entry is not None and entry != previous:
+                return
+        raise TimeoutError(f"{filename} did not reach the server within {UPLOAD_CONFIRM_TIMEOUT} seconds")
+
+
+def get_poller(base_url, flask_url=None):
+    """
+    Shared poller per device URL, started on first use
+    """
+    with _pollers_lock:
+        poller = _pollers.get(base_url)
+        if poller is None:
+            poller = _pollers[base_url] = DevicePoller(base_url, flask_url)
+    poller.start()
+    return poller
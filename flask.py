@@ -1,101 +1,364 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, g
 import os
 import datetime
+import hashlib
+import time
 from flask_cors import CORS
+from werkzeug.utils import secure_filename
+import metrics
+from catalog import RecordingCatalog
+from transcoder import Transcoder
+from ingest import (
+    receive_stream, publish, create_session, load_session, append_chunk, finalize_session,
+    abort_session, UploadTooLarge, UnknownSession, OffsetMismatch, InvalidUpload
+)
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
+CATALOG_DB_PATH = os.getenv('CATALOG_DB_PATH', os.path.join('data', 'catalog.sqlite3'))
+# Partial uploads live on the same filesystem so publishing is an atomic rename
+INCOMING_FOLDER = os.path.join(UPLOAD_FOLDER, '.incoming')
+RECORDING_MAX_AGE = int(os.getenv('RECORDING_MAX_AGE', '300'))
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_MB', '1024')) * 1024 * 1024
+SWEEP_INTERVAL_SECONDS = int(os.getenv('SWEEP_INTERVAL_SECONDS', '60'))
+# Resumable uploads with no new bytes for this long are considered abandoned
+INCOMING_MAX_AGE_HOURS = float(os.getenv('INCOMING_MAX_AGE_HOURS', '24'))
+TRANSCODE_FORMAT = os.getenv('TRANSCODE_FORMAT', 'flac')
+# Originals are deleted this many days after a compressed variant exists (0 keeps them forever).
+# The app decodes the variant when it needs a WAV, so retired recordings can still be processed.
+RETAIN_ORIGINAL_DAYS = int(os.getenv('RETAIN_ORIGINAL_DAYS', '30'))
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
+# Compressed variants are produced in the background after ingest
+transcoder = Transcoder(UPLOAD_FOLDER, TRANSCODE_FORMAT, RETAIN_ORIGINAL_DAYS)
+
+# Metadata index behind GET /files; the sweeper handles empty files and drift
+catalog = RecordingCatalog(UPLOAD_FOLDER, CATALOG_DB_PATH, variants=transcoder, incoming_folder=INCOMING_FOLDER,
+                          incoming_max_age=INCOMING_MAX_AGE_HOURS * 60 * 60)
+catalog.sweep()
+catalog.start_sweeper(SWEEP_INTERVAL_SECONDS)
+transcoder.start()
+
+metrics.register_gauge('catalog.recordings', lambda: catalog.list(0, 1)[0])
+metrics.register_gauge('transcode.queue', transcoder.pending)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    # Streamed downloads are timed until the response is ready, not until the last byte is sent
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics.observe(f"http.{request.endpoint or 'unknown'}", time.perf_counter() - started,
+                        error=response.status_code >= 500)
+    return response
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
     """
-    Endpoint to receive audio recordings from ESP32
+    Endpoint to receive audio recordings from ESP32.
+    The body is streamed to disk in chunks and published atomically.
     """
     try:
-        # Check if the request has data
-        if request.data:
-            # Get the filename from headers or generate one
-            content_disposition = request.headers.get('Content-Disposition', '')
-            if 'filename=' in content_disposition:
-                filename = content_disposition.split('filename=')[1].strip('"')
-            else:
-                # Generate filename with timestamp if none provided
-                timestamp =     datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"recording_{timestamp}.wav"
-            
-            # Full path for saving the file
-            filepath = os.path.join(UPLOAD_FOLDER, filename)
-            
-            # Save the file
-            with open(filepath, 'wb') as f:
-                f.write(request.data)
-            
-            file_size = os.path.getsize(filepath)
-            
-            print(f"File received and saved: {filepath} ({file_size} bytes)")
-            
-            # Return success response
-            return jsonify({
-                'status': 'success',
-                'message': 'File uploaded successfully',
-                'filename': filename,
-                'size': file_size
-            }), 200
+        # Reject oversized uploads before reading the body when the length is known
+        if request.content_length and request.content_length > MAX_UPLOAD_BYTES:
+            return upload_too_large(request.content_length)
+
+        # Get the filename from headers or generate one
+        content_disposition = request.headers.get('Content-Disposition', '')
+        if 'filename=' in content_disposition:
+            filename = secure_filename(content_disposition.split('filename=')[1].strip('"'))
         else:
+            filename = ''
+        if not filename:
+            # Generate filename with timestamp if none provided
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"recording_{timestamp}.wav"
+
+        tmp_path, bytes_received = receive_stream(request.stream, INCOMING_FOLDER, MAX_UPLOAD_BYTES)
+
+        # Check if the request has data
+        if bytes_received == 0:
+            os.remove(tmp_path)
             return jsonify({
                 'status': 'error',
                 'message': 'No data received'
             }), 400
-    
+
+        # Full path for saving the file
+        with metrics.span('upload.publish'):
+            filepath = publish(tmp_path, os.path.join(UPLOAD_FOLDER, filename))
+            catalog.add(filename)
+            transcoder.enqueue(filename)
+
+        metrics.incr('upload.files')
+        metrics.log(f"File received and saved: {filepath} ({bytes_received} bytes)")
+
+        # Return success response
+        return jsonify({
+            'status': 'success',
+            'message': 'File uploaded successfully',
+            'filename': filename,
+            'size': bytes_received,
+            'bytes_received': bytes_received
+        }), 200
+
+    except UploadTooLarge as e:
+        metrics.incr('upload.rejected')
+        metrics.log(f"Upload rejected: {str(e)}")
+        return upload_too_large(e.received)
+
     except Exception as e:
-        print(f"Error during file upload: {str(e)}")
+        metrics.log(f"Error during file upload: {str(e)}")
         return jsonify({
             'status': 'error',
             'message': f'Server error: {str(e)}'
         }), 500
 
+def upload_too_large(bytes_received):
+    return jsonify({
+        'status': 'error',
+        'message': f'File exceeds the maximum upload size of {MAX_UPLOAD_BYTES} bytes',
+        'bytes_received': bytes_received,
+        'max_bytes': MAX_UPLOAD_BYTES
+    }), 413
+
+@app.route('/resumable', methods=['POST'])
+def create_resumable_upload():
+    """
+    Open a resumable upload session.
+    Body: {"filename": "...", "total_size": 123} (total_size optional until finalize)
+    """
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename', ''))
+    if not filename:
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"recording_{timestamp}.wav"
+
+    total_size = data.get('total_size')
+    if total_size is not None and (not isinstance(total_size, int) or total_size < 0):
+        return jsonify({'status': 'error', 'message': 'total_size must be a non-negative integer'}), 400
+    if total_size is not None and total_size > MAX_UPLOAD_BYTES:
+        return upload_too_large(total_size)
+
+    session = create_session(INCOMING_FOLDER, filename, total_size)
+    metrics.log(f"Resumable upload opened: {session['upload_id']} -> {filename}")
+    return resumable_status(session, 201)
+
+@app.route('/resumable/<upload_id>', methods=['GET', 'HEAD'])
+def get_resumable_upload(upload_id):
+    """
+    Query the committed offset after a disconnect
+    """
+    try:
+        return resumable_status(load_session(INCOMING_FOLDER, upload_id))
+    except UnknownSession:
+        return unknown_session(upload_id)
+
+@app.route('/resumable/<upload_id>', methods=['PATCH', 'PUT'])
+def append_resumable_upload(upload_id):
+    """
+    Append a byte range. The Upload-Offset header (or ?offset=) must equal the committed offset.
+    """
+    offset = request.headers.get('Upload-Offset', request.args.get('offset'))
+    try:
+        offset = int(offset)
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': 'Upload-Offset header is required'}), 400
+
+    try:
+        append_chunk(INCOMING_FOLDER, upload_id, offset, request.stream, MAX_UPLOAD_BYTES)
+        return resumable_status(load_session(INCOMING_FOLDER, upload_id))
+    except UnknownSession:
+        return unknown_session(upload_id)
+    except OffsetMismatch as e:
+        # The client resumes from the committed offset, in the body and the Upload-Offset header
+        response = jsonify({
+            'status': 'error',
+            'message': str(e),
+            'upload_id': upload_id,
+            'offset': e.expected
+        })
+        response.headers['Upload-Offset'] = str(e.expected)
+        return response, 409
+    except UploadTooLarge as e:
+        return upload_too_large(e.received)
+
+@app.route('/resumable/<upload_id>/finalize', methods=['POST'])
+def finalize_resumable_upload(upload_id):
+    """
+    Verify total length and WAV header, then publish the recording to /files
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        with metrics.span('upload.publish'):
+            filepath, session = finalize_session(INCOMING_FOLDER, upload_id, UPLOAD_FOLDER, data.get('total_size'))
+            catalog.add(session['filename'])
+            transcoder.enqueue(session['filename'])
+    except UnknownSession:
+        return unknown_session(upload_id)
+    except InvalidUpload as e:
+        metrics.incr('upload.rejected')
+        return jsonify({'status': 'error', 'message': str(e)}), 422
+
+    file_size = os.path.getsize(filepath)
+    metrics.incr('upload.files')
+    metrics.log(f"Resumable upload finalized: {filepath} ({file_size} bytes)")
+    return jsonify({
+        'status': 'success',
+        'message': 'File uploaded successfully',
+        'filename': session['filename'],
+        'size': file_size
+    }), 200
+
+@app.route('/resumable/<upload_id>', methods=['DELETE'])
+def abort_resumable_upload(upload_id):
+    try:
+        abort_session(INCOMING_FOLDER, upload_id)
+    except UnknownSession:
+        return unknown_session(upload_id)
+    return jsonify({'status': 'success', 'message': 'Upload aborted'}), 200
+
+def resumable_status(session, status_code=200):
+    response = jsonify({
+        'status': 'success',
+        'upload_id': session['upload_id'],
+        'filename': session['filename'],
+        'offset': session['offset'],
+        'total_size': session.get('total_size')
+    })
+    response.headers['Upload-Offset'] = str(session['offset'])
+    return response, status_code
+
+def unknown_session(upload_id):
+    return jsonify({'status': 'error', 'message': f'Unknown upload session: {upload_id}'}), 404
+
 @app.route('/files', methods=['GET'])
 def list_files():
-    files = []
-    for filename in os.listdir(UPLOAD_FOLDER):
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-
-        # Hanya proses file yang benar-benar ada
-        if os.path.isfile(filepath):
-            size = os.path.getsize(filepath)
-
-            # Hapus file jika kosong
-            if size == 0:
-                print(f"File kosong terdeteksi, menghapus: {filename}")
-                os.remove(filepath)
-                continue  # Lewati file ini
-
-            # Simpan file valid ke daftar
-            modified = datetime.datetime.fromtimestamp(
-                os.path.getmtime(filepath)
-            ).strftime('%Y-%m-%d %H:%M:%S')
-            
-            files.append({
-                'name': filename,
-                'size': size,
-                'modified': modified
-            })
-
-    return jsonify({'files': files})
+    """
+    List recordings from the catalog.
+    Query: offset, limit, sort (name|size|modified), order (asc|desc), since/until (YYYY-MM-DD)
+    """
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        since = parse_date_arg(request.args.get('since'))
+        until = parse_date_arg(request.args.get('until'), end_of_day=True)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Invalid query parameter: {str(e)}'}), 400
+
+    sort = request.args.get('sort', 'modified')
+    order = request.args.get('order', 'desc')
+
+    # The ETag covers the catalog version and the query, so unchanged pages cost one lookup
+    etag = hashlib.sha1(f"{catalog.version()}|{request.query_string.decode()}".encode()).hexdigest()
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    try:
+        with metrics.span('files.query'):
+            total, files = catalog.list(offset, limit, sort, order, since, until)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    response = jsonify({
+        'files': files,
+        'total': total,
+        'offset': offset,
+        'limit': limit
+    })
+    response.set_etag(etag)
+    return response
+
+def parse_date_arg(value, end_of_day=False):
+    if not value:
+        return None
+    parsed = datetime.datetime.fromisoformat(value)
+    if end_of_day and len(value) == 10:
+        parsed += datetime.timedelta(days=1)
+    return parsed.timestamp()
 
 
 @app.route('/uploads/<filename>', methods=['GET'])
 def download_file(filename):
     """
-    Endpoint to download a specific file
+    Endpoint to download a specific file.
+    ?variant=compressed serves the compressed archival copy when it exists.
+    """
+    return send_recording(filename, as_attachment=True)
+
+@app.route('/stream/<filename>', methods=['GET'])
+def stream_file(filename):
+    """
+    Endpoint for inline playback; players seek with Range requests instead of re-downloading
+    """
+    return send_recording(filename, as_attachment=False)
+
+def send_recording(filename, as_attachment):
+    # Dot entries are internal (.incoming, .compressed, lock files), never recordings
+    if filename.startswith('.'):
+        return jsonify({'status': 'error', 'message': 'File not found'}), 404
+    # conditional=True answers Range (206) and If-None-Match / If-Modified-Since (304)
+    variant_path = transcoder.variant_path(filename)
+    original_exists = os.path.isfile(os.path.join(UPLOAD_FOLDER, filename))
+    if variant_path and (request.args.get('variant') == 'compressed' or not original_exists):
+        return send_from_directory(
+            transcoder.variant_folder,
+            os.path.basename(variant_path),
+            as_attachment=as_attachment,
+            download_name=os.path.splitext(filename)[0] + os.path.splitext(variant_path)[1],
+            mimetype=transcoder.mimetype,
+            conditional=True,
+            etag=True,
+            max_age=RECORDING_MAX_AGE
+        )
+
+    return send_from_directory(
+        UPLOAD_FOLDER,
+        filename,
+        as_attachment=as_attachment,
+        conditional=True,
+        etag=True,
+        max_age=RECORDING_MAX_AGE
+    )
+
+@app.route('/uploads/<filename>', methods=['DELETE'])
+def delete_file(filename):
+    """
+    Endpoint to delete a recording and drop it from the catalog
+    """
+    filepath = os.path.join(UPLOAD_FOLDER, secure_filename(filename))
+    name = os.path.basename(filepath)
+    variant_path = transcoder.variant_path(name)
+    if not os.path.isfile(filepath) and not variant_path:
+        return jsonify({'status': 'error', 'message': 'File not found'}), 404
+
+    for path in (filepath, variant_path):
+        if path and os.path.isfile(path):
+            os.remove(path)
+    catalog.remove(name)
+    return jsonify({'status': 'success', 'message': 'File deleted', 'filename': name}), 200
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Timings, counters and recent traces of this server process.
+    JSON by default; ?format=prometheus for the Prometheus text format.
     """
-    return send_from_directory(UPLOAD_FOLDER, filename, as_attachment=True)
+    if request.args.get('format') == 'prometheus':
+        return app.response_class(metrics.prometheus(), mimetype='text/plain; version=0.0.4')
+    return jsonify(metrics.snapshot())
 
 if __name__ == '__main__':
-    print(f"Server started. Recordings will be saved to {os.path.abspath(UPLOAD_FOLDER)}")
+    metrics.log(f"Server started. Recordings will be saved to {os.path.abspath(UPLOAD_FOLDER)}")
     app.run(host='0.0.0.0', port=5055, debug=True)
@@ -0,0 +1,85 @@
+import hashlib
+import os
+import threading
+import time
+
+import metrics
+from models import client
+
+# File yang diupload ke Gemini otomatis dihapus setelah 48 jam
+FILE_TTL_SECONDS = 48 * 60 * 60
+# Jangan pakai handle yang hampir kedaluwarsa di sisi server
+EXPIRY_MARGIN_SECONDS = 10 * 60
+
+# Registry dibagi ke semua sesi Streamlit karena modul hanya diimport sekali per proses
+_registry = {}
+_upload_locks = {}
+_registry_lock = threading.Lock()
+# Hash per (path, ukuran, mtime) agar file yang sama tidak di-hash ulang tiap pemanggilan
+_hash_cache = {}
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """
+    Hash SHA-256 dari isi file, dibaca per chunk agar rekaman panjang tidak dimuat ke memori
+    """
+    stat = os.stat(path)
+    cache_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if cache_key in _hash_cache:
+        return _hash_cache[cache_key]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    _hash_cache[cache_key] = digest.hexdigest()
+    return _hash_cache[cache_key]
+
+
+def _expires_at(audio_file):
+    expiration = getattr(audio_file, 'expiration_time', None)
+    if expiration is not None and hasattr(expiration, 'timestamp'):
+        return expiration.timestamp()
+    return time.time() + FILE_TTL_SECONDS
+
+
+def _purge_expired(now):
+    for digest in [d for d, entry in _registry.items() if entry['expires_at'] <= now]:
+        del _registry[digest]
+        _upload_locks.pop(digest, None)
+
+
+def upload_audio(path, digest=None):
+    """
+    Upload audio ke Gemini sekali saja per isi file dan kembalikan handle yang sama
+    selama file remote belum kedaluwarsa
+    """
+    digest = digest or file_sha256(path)
+
+    with _registry_lock:
+        _purge_expired(time.time())
+        lock = _upload_locks.setdefault(digest, threading.Lock())
+
+    # Lock per hash: dua sesi yang meminta file yang sama menunggu satu upload saja
+    with lock:
+        entry = _registry.get(digest)
+        if entry and entry['expires_at'] - EXPIRY_MARGIN_SECONDS > time.time():
+            metrics.incr('gemini.file_upload.reused')
+            return entry['file']
+
+        with metrics.span('gemini.file_upload', bytes=os.path.getsize(path)):
+            audio_file = client().upload_file(path=path)
+        with _registry_lock:
+            _registry[digest] = {
+                'file': audio_file,
+                'expires_at': _expires_at(audio_file)
+            }
+        return audio_file
+
+
+def forget(digest):
+    """
+    Hapus handle dari registry, misalnya jika file remote sudah tidak tersedia
+    """
+    with _registry_lock:
+        _registry.pop(digest, None)
@@ -0,0 +1,90 @@
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Keep-alive connections kept per host (Flask server, each ESP32)
+POOL_MAXSIZE = 8
+
+# (connect, read) timeouts per endpoint path prefix; the longest matching prefix wins
+DEFAULT_TIMEOUT = (3, 10)
+ENDPOINT_TIMEOUTS = {
+    '/status': (2, 2),
+    '/start': (3, 10),
+    '/stop': (3, 15),
+    '/upload': (3, 10),
+    '/test': (3, 30),
+    '/files': (3, 5),
+    '/uploads/': (3, 60),
+    '/stream/': (3, 60),
+    '/resumable': (3, 60)
+}
+
+# Only idempotent requests are retried; a repeated POST /start would start a second recording
+RETRY = Retry(
+    total=3,
+    connect=3,
+    read=2,
+    status=2,
+    backoff_factor=0.3,
+    backoff_jitter=0.5,
+    status_forcelist=(502, 503, 504),
+    allowed_methods=frozenset({'GET', 'HEAD'}),
+    raise_on_status=False
+)
+
+_adapters = {}
+_adapters_lock = threading.Lock()
+_local = threading.local()
+
+
+def _host_key(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _adapter(host):
+    # One adapter (connection pool) per host, shared by every thread
+    with _adapters_lock:
+        adapter = _adapters.get(host)
+        if adapter is None:
+            adapter = _adapters[host] = HTTPAdapter(
+                pool_connections=1, pool_maxsize=POOL_MAXSIZE, max_retries=RETRY, pool_block=False
+            )
+        return adapter
+
+
+def _session(host):
+    # Sessions are per thread (cookie jars are not thread-safe) but mount the shared pool
+    sessions = getattr(_local, 'sessions', None)
+    if sessions is None:
+        sessions = _local.sessions = {}
+    session = sessions.get(host)
+    if session is None:
+        session = sessions[host] = requests.Session()
+        session.mount(host, _adapter(host))
+    return session
+
+
+def timeout_for(url):
+    path = urlsplit(url).path or '/'
+    matches = [prefix for prefix in ENDPOINT_TIMEOUTS if path.startswith(prefix)]
+    return ENDPOINT_TIMEOUTS[max(matches, key=len)] if matches else DEFAULT_TIMEOUT
+
+
+def request(method, url, **kwargs):
+    """
+    Send a request through the pooled keep-alive connection for the URL's host
+    """
+    kwargs.setdefault('timeout', timeout_for(url))
+    return _session(_host_key(url)).request(method, url, **kwargs)
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
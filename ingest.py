@@ -0,0 +1,270 @@
+import json
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+import uuid
+
+import metrics
+
+# Ukuran buffer baca; memori per upload tetap sebesar ini berapa pun panjang rekamannya
+CHUNK_SIZE = 64 * 1024
+
+
+_UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+_session_locks = {}
+_session_locks_lock = threading.Lock()
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, max_bytes, received):
+        super().__init__(f"Upload exceeds the maximum size of {max_bytes} bytes")
+        self.max_bytes = max_bytes
+        self.received = received
+
+
+class UnknownSession(Exception):
+    pass
+
+
+class OffsetMismatch(Exception):
+    def __init__(self, expected, offset):
+        super().__init__(f"Upload offset {offset} does not match committed offset {expected}")
+        self.expected = expected
+        self.offset = offset
+
+
+class InvalidUpload(Exception):
+    pass
+
+
+def receive_stream(stream, incoming_dir, max_bytes, chunk_size=CHUNK_SIZE):
+    """
+    Copy a request body to a temporary file in fixed-size chunks.
+    Returns (temp_path, bytes_received); the temp file is removed on failure.
+    """
+    os.makedirs(incoming_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=incoming_dir, suffix='.part')
+    received = 0
+    # Time spent waiting on the client vs. writing to disk, reported separately
+    read_seconds = write_seconds = 0.0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                started = time.perf_counter()
+                chunk = stream.read(chunk_size)
+                read_seconds += time.perf_counter() - started
+                if not chunk:
+                    break
+                received += len(chunk)
+                if received > max_bytes:
+                    raise UploadTooLarge(max_bytes, received)
+                started = time.perf_counter()
+                f.write(chunk)
+                write_seconds += time.perf_counter() - started
+            started = time.perf_counter()
+            f.flush()
+            os.fsync(f.fileno())
+            write_seconds += time.perf_counter() - started
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    finally:
+        metrics.observe('upload.receive', read_seconds)
+        metrics.observe('upload.disk_write', write_seconds)
+    metrics.incr('upload.bytes', received)
+    return tmp_path, received
+
+
+def publish(tmp_path, dest_path):
+    """
+    Atomically move a completed upload into place
+    """
+    os.replace(tmp_path, dest_path)
+    return dest_path
+
+
+def _session_paths(incoming_dir, upload_id):
+    if not _UPLOAD_ID_RE.match(upload_id or ''):
+        raise UnknownSession(upload_id)
+    base = os.path.join(incoming_dir, upload_id)
+    return base + '.part', base + '.json'
+
+
+def _session_lock(upload_id):
+    with _session_locks_lock:
+        return _session_locks.setdefault(upload_id, threading.Lock())
+
+
+def create_session(incoming_dir, filename, total_size=None):
+    """
+    Open a resumable upload session and return its metadata
+    """
+    os.makedirs(incoming_dir, exist_ok=True)
+    upload_id = uuid.uuid4().hex
+    part_path, meta_path = _session_paths(incoming_dir, upload_id)
+    session = {
+        'upload_id': upload_id,
+        'filename': filename,
+        'total_size': total_size,
+        'created': time.time()
+    }
+    open(part_path, 'wb').close()
+    with open(meta_path, 'w') as f:
+        json.dump(session, f)
+    session['offset'] = 0
+    return session
+
+
+def load_session(incoming_dir, upload_id):
+    """
+    Session metadata plus the committed offset (bytes safely on disk)
+    """
+    part_path, meta_path = _session_paths(incoming_dir, upload_id)
+    try:
+        with open(meta_path) as f:
+            session = json.load(f)
+        session['offset'] = os.path.getsize(part_path)
+    except (OSError, ValueError):
+        raise UnknownSession(upload_id)
+    return session
+
+
+def append_chunk(incoming_dir, upload_id, offset, stream, max_bytes, chunk_size=CHUNK_SIZE):
+    """
+    Append a byte range starting at an explicit offset. Bytes that reach disk before a
+    disconnect stay committed, so the client resumes from the offset it queries afterwards.
+    """
+    part_path, _ = _session_paths(incoming_dir, upload_id)
+    with _session_lock(upload_id):
+        session = load_session(incoming_dir, upload_id)
+        committed = session['offset']
+        if offset != committed:
+            raise OffsetMismatch(committed, offset)
+
+        limit = max_bytes
+        if session.get('total_size') is not None:
+            limit = min(limit, session['total_size'])
+
+        read_seconds = write_seconds = 0.0
+        with open(part_path, 'ab') as f:
+            try:
+                while True:
+                    started = time.perf_counter()
+                    chunk = stream.read(chunk_size)
+                    read_seconds += time.perf_counter() - started
+                    if not chunk:
+                        break
+                    if committed + len(chunk) > limit:
+                        # Drop this whole request, keep what earlier requests committed
+                        f.truncate(offset)
+                        raise UploadTooLarge(limit, committed + len(chunk))
+                    started = time.perf_counter()
+                    f.write(chunk)
+                    write_seconds += time.perf_counter() - started
+                    committed += len(chunk)
+            finally:
+                started = time.perf_counter()
+                f.flush()
+                os.fsync(f.fileno())
+                metrics.observe('upload.receive', read_seconds)
+                metrics.observe('upload.disk_write', write_seconds + time.perf_counter() - started)
+        metrics.incr('upload.bytes', committed - offset)
+        return committed
+
+
+def validate_wav(path, total_size):
+    """
+    Check the RIFF/WAVE header against the number of bytes actually received
+    """
+    with open(path, 'rb') as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+            raise InvalidUpload('File is not a RIFF/WAVE file')
+        riff_size = struct.unpack('<I', header[4:8])[0]
+        if riff_size + 8 != total_size:
+            raise InvalidUpload(f'RIFF size {riff_size + 8} does not match received length {total_size}')
+
+        has_fmt = False
+        position = 12
+        while position + 8 <= total_size:
+            chunk_id, chunk_size = struct.unpack('<4sI', f.read(8))
+            if chunk_id == b'fmt ':
+                has_fmt = True
+            if chunk_id == b'data':
+                if not has_fmt:
+                    raise InvalidUpload('WAV data chunk appears before fmt chunk')
+                if position + 8 + chunk_size > total_size:
+                    raise InvalidUpload('WAV data chunk is longer than the received file')
+                return True
+            position += 8 + chunk_size + (chunk_size % 2)
+            f.seek(position)
+    raise InvalidUpload('WAV file has no data chunk')
+
+
+def finalize_session(incoming_dir, upload_id, dest_dir, total_size=None):
+    """
+    Verify total length and WAV header, then publish the file. Returns (dest_path, session).
+    """
+    part_path, meta_path = _session_paths(incoming_dir, upload_id)
+    with _session_lock(upload_id):
+        session = load_session(incoming_dir, upload_id)
+        expected = total_size if total_size is not None else session.get('total_size')
+        if expected is None:
+            raise InvalidUpload('Total size is required to finalize the upload')
+        if session['offset'] != expected:
+            raise InvalidUpload(f"Received {session['offset']} bytes, expected {expected}")
+        if session['filename'].lower().endswith('.wav'):
+            validate_wav(part_path, expected)
+
+        dest_path = publish(part_path, os.path.join(dest_dir, session['filename']))
+        os.remove(meta_path)
+    with _session_locks_lock:
+        _session_locks.pop(upload_id, None)
+    return dest_path, session
+
+
+def abort_session(incoming_dir, upload_id):
+    part_path, meta_path = _session_paths(incoming_dir, upload_id)
+    with _session_lock(upload_id):
+        for path in (part_path, meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+    with _session_locks_lock:
+        _session_locks.pop(upload_id, None)
+
+
+def expire_sessions(incoming_dir, max_age):
+    """
+    Remove resumable sessions and leftover temp files that have not been written to for
+    max_age seconds. A session's age is its most recent append, so slow uploads survive.
+    Returns the names removed.
+    """
+    if not os.path.isdir(incoming_dir):
+        return []
+    cutoff = time.time() - max_age
+    names = set(os.listdir(incoming_dir))
+    removed = []
+    for name in sorted(names):
+        stem, ext = os.path.splitext(name)
+        if ext == '.json' and _UPLOAD_ID_RE.match(stem):
+            paths = [os.path.join(incoming_dir, stem + suffix) for suffix in ('.part', '.json')]
+            try:
+                last_write = max(os.path.getmtime(path) for path in paths if os.path.exists(path))
+            except ValueError:
+                continue
+            if last_write < cutoff:
+                abort_session(incoming_dir, stem)
+                removed.append(stem)
+        elif ext == '.part' and stem + '.json' not in names:
+            # Interrupted single-request uploads and sessions whose metadata is gone
+            path = os.path.join(incoming_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed.append(stem)
+            except OSError:
+                pass
+    return removed
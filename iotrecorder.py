@@ -1,22 +1,74 @@
+import base64
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+import streamlit as st
+from dotenv import load_dotenv
+
+import httpclient
+from esp32poller import get_poller
+
+# Loaded once when the page is first opened, not on every rerun
+load_dotenv()
+
+# Configuration variables
+FLASK_SERVER_URL = os.getenv("FLASK_SERVER")  # Change to your Flask server IP/port
+ESP32_URL = os.getenv("ESP32_URL")  # Change to your ESP32's IP address
+RECORDINGS_PAGE_SIZE = 50
+STATUS_REFRESH_SECONDS = 3
+COMMAND_LABELS = {'start': 'Start recording', 'stop': 'Stop recording', 'upload': 'Upload', 'test': 'Diagnostics'}
+# Memory budget for recordings prepared for download, shared by every session
+DOWNLOAD_CACHE_MAX_BYTES = int(os.getenv("DOWNLOAD_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+_download_cache = OrderedDict()
+_download_cache_bytes = 0
+_download_cache_lock = threading.Lock()
+
+
+def download_key(file_data):
+    """
+    A recording that is rewritten keeps its name but changes size or mtime
+    """
+    return (file_data['name'], file_data['size'], file_data['modified'])
 
-def microfon():
-    import streamlit as st
-    import requests
-    import json
-    import time
-    import os
-    import pandas as pd
-    import datetime
-    import base64
-    from io import BytesIO
-    from dotenv import load_dotenv
-    import os
-    load_dotenv()
-
-    # Configuration variables
-    FLASK_SERVER_URL = os.getenv("FLASK_SERVER")  # Change to your Flask server IP/port
-    ESP32_URL = os.getenv("ESP32_URL")  # Change to your ESP32's IP address
 
+def cached_download(key):
+    with _download_cache_lock:
+        data = _download_cache.get(key)
+        if data is not None:
+            _download_cache.move_to_end(key)
+        return data
+
+
+def fetch_download(key, url):
+    """
+    Recording bytes for the download button, fetched once and kept in an LRU within the budget
+    """
+    global _download_cache_bytes
+    data = cached_download(key)
+    if data is not None:
+        return data
+
+    response = httpclient.get(url)
+    response.raise_for_status()
+    data = response.content
+    if len(data) > DOWNLOAD_CACHE_MAX_BYTES:
+        return data
+
+    with _download_cache_lock:
+        if key not in _download_cache:
+            _download_cache[key] = data
+            _download_cache_bytes += len(data)
+        while _download_cache_bytes > DOWNLOAD_CACHE_MAX_BYTES:
+            _, evicted = _download_cache.popitem(last=False)
+            _download_cache_bytes -= len(evicted)
+    return data
+
+
+def microfon():
     # Set page configuration
     # st.set_page_config(
     #     page_title="ESP32 Audio Recorder",
@@ -24,34 +76,49 @@ def microfon():
     #     layout="wide"
     # )
 
-    # Helper function to make API calls to ESP32
-    def call_esp32_api(endpoint, method="GET", data=None):
-        try:
-            url = f"{ESP32_URL}/{endpoint}"
-            if method == "GET":
-                response = requests.get(url, timeout=20)
-            else:  # POST
-                response = requests.post(url, json=data if data else {}, timeout=20)
-            
-            return response.json() if response.status_code == 200 else None
-        except Exception as e:
-            st.error(f"Failed to connect to ESP32: {str(e)}")
-            return None
+    # Shared background poller for the device; status and commands never block this script
+    poller = get_poller(ESP32_URL, FLASK_SERVER_URL)
 
     # Helper function to make API calls to Flask server
     def call_flask_api(endpoint, method="GET", data=None):
         try:
             url = f"{FLASK_SERVER_URL}/{endpoint}"
             if method == "GET":
-                response = requests.get(url, timeout=5)
+                response = httpclient.get(url)
             else:  # POST
-                response = requests.post(url, json=data if data else {}, timeout=5)
+                response = httpclient.post(url, json=data if data else {})
             
             return response.json() if response.status_code == 200 else None
         except Exception as e:
             st.error(f"Failed to connect to Flask server: {str(e)}")
             return None
 
+    # Fetch one page of recordings, revalidating the cached page with its ETag
+    def fetch_recordings(offset, limit):
+        params = {'offset': offset, 'limit': limit}
+        cached = st.session_state.recordings_cache
+        headers = {}
+        if cached and cached['params'] == params and cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        try:
+            response = httpclient.get(f"{FLASK_SERVER_URL}/files", params=params, headers=headers)
+        except Exception as e:
+            st.error(f"Failed to connect to Flask server: {str(e)}")
+            return None
+
+        if response.status_code == 304:
+            return cached['data']
+        if response.status_code != 200:
+            return None
+
+        data = response.json()
+        st.session_state.recordings_cache = {
+            'params': params,
+            'etag': response.headers.get('ETag'),
+            'data': data
+        }
+        return data
+
     # Function to create a download link for audio files
     def get_audio_download_link(file_path, file_name):
         try:
@@ -85,12 +152,12 @@ def microfon():
         st.session_state.recording_duration = 0
     if 'last_file' not in st.session_state:
         st.session_state.last_file = None
-    if 'last_status_check' not in st.session_state:
-        st.session_state.last_status_check = 0
-    if 'upload_status' not in st.session_state:
-        st.session_state.upload_status = None  # None, "uploading", "success", "failed"
-    if 'upload_file' not in st.session_state:
-        st.session_state.upload_file = None
+    if 'device_commands' not in st.session_state:
+        st.session_state.device_commands = []  # ids of commands queued on the poller
+    if 'recordings_page' not in st.session_state:
+        st.session_state.recordings_page = 0
+    if 'recordings_cache' not in st.session_state:
+        st.session_state.recordings_cache = None
 
     # Create the app header
     st.title("🎙️ ESP32 Audio Recorder")
@@ -100,21 +167,22 @@ def microfon():
     col1, col2 = st.columns([1, 1])
 
     # ESP32 Control Panel (Left Column)
-    with col1:
+    # Runs as a fragment so it refreshes from the poller snapshot without rerunning the page
+    @st.fragment(run_every=STATUS_REFRESH_SECONDS)
+    def device_panel():
         st.header("Device Control")
         
-        # Get ESP32 status
-        if time.time() - st.session_state.last_status_check > 5:  # Check status every 5 seconds
-            esp32_status = call_esp32_api("status")
-            if esp32_status:
-                st.session_state.esp32_status = esp32_status
-                st.session_state.recording = esp32_status.get("isRecording", False)
-                st.session_state.last_status_check = time.time()
+        # Latest status from the background poller (never blocks on the device)
+        snapshot = poller.snapshot()
+        esp_status = snapshot['status']
+        st.session_state.esp32_status = esp_status
         
-        # Display device status
-        esp_status = st.session_state.esp32_status
+        if esp_status and not snapshot['ok']:
+            seen = int(time.time() - snapshot['updated_at'])
+            st.warning(f"ESP32 not responding, showing status from {seen} seconds ago. Retrying in the background.")
         
         if esp_status:
+            st.session_state.recording = esp_status.get("isRecording", False)
             st.subheader("Device Status")
             status_col1, status_col2 = st.columns(2)
             
@@ -127,64 +195,25 @@ def microfon():
                 recording_state = "✅ Recording" if esp_status.get("isRecording", False) else "⏹️ Not Recording"
                 st.markdown(f"**Recording Status:** {recording_state}")
             
+            busy = any(command_in_progress(command_id) for command_id in st.session_state.device_commands)
+            
             if esp_status.get("isRecording", False):
                 # Show recording progress
                 rec_time = esp_status.get("recordingTime", 0)
                 st.write(f"Recording time: {rec_time} seconds")
                 
-                # Add a stop button
-                if st.button("🛑 Stop Recording", key="stop_recording", type="primary"):
-                    response = call_esp32_api("stop", method="POST")
-                    if response and response.get("status") == "success":
-                        st.session_state.recording = False
-                        st.session_state.last_file = response.get("filename")
-                        st.session_state.recording_duration = response.get("duration", 0)
-                        st.success(f"Recording stopped: {response.get('filename')}")
-
-                        # Otomatis upload setelah stop
-                        st.info("⏫ Uploading recording to server...")
-                        try:
-                            upload_response = call_esp32_api("upload", method="POST")
-                            if upload_response and upload_response.get("status") == "success":
-                                st.success(f"✅ File uploaded successfully: {st.session_state.last_file}")
-                                st.session_state.upload_status = "success"
-                            else:
-                                st.error("❌ Upload failed")
-                                st.session_state.upload_status = "failed"
-                        except Exception as e:
-                            st.error(f"❌ Upload error: {str(e)}")
-                            st.session_state.upload_status = "failed"
-                        
-                        time.sleep(1)
-                        st.rerun()
-                    else:
-                        st.error("Failed to stop recording")
-
+                # Stop, then upload automatically once the stop succeeds
+                if st.button("🛑 Stop Recording", key="stop_recording", type="primary", disabled=busy):
+                    st.session_state.device_commands.append(poller.submit("stop", then="upload"))
             else:
                 # Show start recording button
-                start_disabled = not (esp_status.get("sdCardOK", False) and esp_status.get("microphoneOK", False))
+                start_disabled = busy or not (esp_status.get("sdCardOK", False) and esp_status.get("microphoneOK", False))
                 if st.button("🎙️ Start Recording", key="start_recording", disabled=start_disabled, type="primary"):
-                    st.info("⏳ Sending start command to ESP32...")
-
-                    response = call_esp32_api("start", method="POST")
-                    if response and response.get("status") == "success":
-                        # Langsung update status recording ke True
-                        st.session_state.recording = True
-                        st.session_state.recording_start_time = time.time()
-                        st.success("🎙️ Recording started!")
-
-                        # Optional: jalankan polling background kalau mau update status lengkap
-                        for _ in range(3):
-                            time.sleep(1)
-                            updated_status = call_esp32_api("status")
-                            if updated_status:
-                                st.session_state.esp32_status = updated_status
-                                break
-
-                        st.rerun()
-                    else:
-                        st.error("Failed to send start command to ESP32")
-
+                    st.session_state.device_commands.append(poller.submit("start"))
+                    st.session_state.recording_start_time = time.time()
+            
+            # Progress of commands sent from this session
+            render_commands()
             
             # Show last recording info
             if st.session_state.last_file:
@@ -192,68 +221,61 @@ def microfon():
                 st.write(f"File: {st.session_state.last_file}")
                 if st.session_state.recording_duration > 0:
                     st.write(f"Duration: {st.session_state.recording_duration} seconds")
-                
-                # Status upload
-                upload_status_container = st.empty()
-                
-                # Jika sedang dalam proses upload, tampilkan spinner dan status
-                if st.session_state.upload_status == "uploading":
-                    with upload_status_container.container():
-                        st.markdown("🔄 **File sedang diupload**: " + st.session_state.upload_file)
-                        st.spinner("Menunggu upload selesai...")
-                        
-                        # Lakukan upload
-                        try:
-                            response = call_esp32_api("upload", method="POST")
-                            
-                            if response and response.get("status") == "success":
-                                st.session_state.upload_status = "success"
-                            else:
-                                st.session_state.upload_status = "failed"
-                            
-                            # Rerun untuk menampilkan status baru
-                            time.sleep(1)  # Tunggu sebentar untuk memastikan respons terproses
-                            st.rerun()
-                        
-                        except Exception as e:
-                            st.session_state.upload_status = "failed"
-                            st.error(f"Error saat upload: {str(e)}")
-                            time.sleep(1)
-                            st.rerun()
-                
-                # Jika upload berhasil
-                elif st.session_state.upload_status == "success":
-                    upload_status_container.success(f"✅ **File berhasil diupload**: {st.session_state.upload_file}")
-                    if st.button("🔄 Clear Status", key="clear_success"):
-                        st.session_state.upload_status = None
-                        st.session_state.upload_file = None
-                        st.rerun()
-                
-                # Jika upload gagal
-                elif st.session_state.upload_status == "failed":
-                    upload_status_container.error(f"❌ **Upload gagal**: {st.session_state.upload_file}")
-                    if st.button("🔄 Clear Status", key="clear_failed"):
-                        st.session_state.upload_status = None
-                        st.session_state.upload_file = None
-                        st.rerun()
-                
             
             # Add run diagnostics button
             st.subheader("Maintenance")
-            if st.button("🔍 Run Diagnostics", key="run_diagnostics", disabled=esp_status.get("isRecording", False)):
-                response = call_esp32_api("test", method="POST")
-                if response and response.get("status") == "success":
-                    st.success("Diagnostics completed!")
-                    # Update status
-                    st.session_state.esp32_status = response
-                    time.sleep(1)
-                    st.rerun()
-                else:
-                    st.error("Failed to run diagnostics")
+            if st.button("🔍 Run Diagnostics", key="run_diagnostics", disabled=busy or esp_status.get("isRecording", False)):
+                st.session_state.device_commands.append(poller.submit("test"))
         else:
-            st.error("Unable to connect to ESP32. Check the device and make sure it's on the same network.")
+            if snapshot['checked_at'] is None:
+                st.info("⏳ Connecting to ESP32...")
+            else:
+                st.error("Unable to connect to ESP32. Check the device and make sure it's on the same network.")
             if st.button("🔄 Retry Connection"):
-                st.rerun()
+                poller.refresh()
+
+    def command_in_progress(command_id):
+        command = poller.command(command_id)
+        if command is None:
+            return False
+        if command['state'] in ('pending', 'running', 'uploading'):
+            return True
+        return command['next'] is not None and command_in_progress(command['next'])
+
+    def render_commands():
+        commands = [poller.command(command_id) for command_id in st.session_state.device_commands]
+        commands = [command for command in commands if command]
+        # Follow-up commands (stop -> upload) are shown after the command that queued them
+        for command in commands:
+            if command['next'] and command['next'] not in st.session_state.device_commands:
+                st.session_state.device_commands.append(command['next'])
+        
+        for command in commands:
+            label = COMMAND_LABELS.get(command['command'], command['command'])
+            if command['state'] == 'pending':
+                st.info(f"⏳ {label}: waiting for the device...")
+            elif command['state'] == 'running':
+                st.info(f"⏳ {label}: sending command to ESP32...")
+            elif command['state'] == 'uploading':
+                st.info(f"⏫ {label}: waiting for the file to reach the server...")
+            elif command['state'] == 'success':
+                result = command['result'] or {}
+                if command['command'] == 'stop' and result.get('filename'):
+                    st.session_state.last_file = result.get('filename')
+                    st.session_state.recording_duration = result.get("duration", 0)
+                st.success(f"✅ {label}: {result.get('message', 'done')}")
+            else:
+                st.error(f"❌ {label} failed: {command['error']}")
+        
+        finished = [command for command in commands if command['state'] in ('success', 'failed')]
+        if finished and st.button("🔄 Clear Status", key="clear_commands"):
+            done_ids = {command['id'] for command in finished}
+            st.session_state.device_commands = [
+                command_id for command_id in st.session_state.device_commands if command_id not in done_ids
+            ]
+
+    with col1:
+        device_panel()
 
     # Recordings Library (Right Column)
     with col2:
@@ -263,15 +285,36 @@ def microfon():
         if st.button("🔄 Refresh Recordings"):
             st.rerun()
         
-        # Get list of recordings from Flask server
-        files_data = call_flask_api("files")
+        # Get one page of recordings from Flask server
+        page = st.session_state.recordings_page
+        files_data = fetch_recordings(page * RECORDINGS_PAGE_SIZE, RECORDINGS_PAGE_SIZE)
         
         if files_data and "files" in files_data:
             files = files_data["files"]
+            total = files_data.get("total", len(files))
+            page_count = max((total + RECORDINGS_PAGE_SIZE - 1) // RECORDINGS_PAGE_SIZE, 1)
             
-            if not files:
+            if not files and page > 0:
+                # The page emptied out (recordings deleted); go back to the first page
+                st.session_state.recordings_page = 0
+                st.rerun()
+            elif not files:
                 st.write("No recordings found.")
             else:
+                # Page navigation
+                if page_count > 1:
+                    nav_col1, nav_col2, nav_col3 = st.columns([1, 2, 1])
+                    with nav_col1:
+                        if st.button("◀ Prev", disabled=page == 0):
+                            st.session_state.recordings_page = page - 1
+                            st.rerun()
+                    with nav_col2:
+                        st.write(f"Page {page + 1} of {page_count} ({total} recordings)")
+                    with nav_col3:
+                        if st.button("Next ▶", disabled=page + 1 >= page_count):
+                            st.session_state.recordings_page = page + 1
+                            st.rerun()
+
                 # Create a dataframe for better display
                 df = pd.DataFrame(files)
                 
@@ -309,20 +352,27 @@ def microfon():
                             # Buat URL untuk audio
                             audio_url = f"{FLASK_SERVER_URL}/uploads/{selected_file}"
                             
-                            # Tampilkan audio player
-                            st.audio(audio_url)
+                            # Tampilkan audio player (inline stream, seeks with Range requests)
+                            st.audio(f"{FLASK_SERVER_URL}/stream/{selected_file}")
 
-                            # Tombol untuk download audio
-                            st.download_button(
-                                label="⬇️ Download Recording",
-                                data=requests.get(audio_url).content,
-                                file_name=selected_file
-                            )
+                            # Download bytes are only fetched on request, not on every rerun
+                            key = download_key(selected_file_data)
+                            data = cached_download(key)
+                            if data is None and st.button("📦 Prepare Download"):
+                                with st.spinner("Fetching recording..."):
+                                    data = fetch_download(key, audio_url)
+                            if data is not None:
+                                st.download_button(
+                                    label="⬇️ Download Recording",
+                                    data=data,
+                                    file_name=selected_file
+                                )
 
                             # 🔄 Tombol untuk pindah ke halaman audio_to_materi
                             if st.button("🔄 Summarize Audio"):
                                 st.session_state.current_page = 'audio_to_materi'
                                 st.session_state['selected_audio_file'] = selected_file  # bawa nama file ke halaman selanjutnya
+                                st.session_state['selected_audio_size'] = selected_file_data['size']
                                 st.session_state['from_recording'] = True
                                 st.rerun()
 
@@ -0,0 +1,162 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import metrics
+
+ACTIVE_STATES = ('queued', 'running')
+# Finished jobs are kept this long so a returning session can still pick up the result
+JOB_RETENTION_SECONDS = 7 * 24 * 60 * 60
+
+
+class JobQueue:
+    """
+    Background jobs for long model calls. Jobs outlive the script run that started them,
+    run on a bounded worker pool and keep their state in SQLite so any rerun can poll
+    them by id. Submitting a key that is already queued or running returns that job.
+    Interactive jobs (a teacher waiting on a quiz or a PDF) run on their own pool so they
+    never queue behind multi-minute summaries.
+    """
+
+    def __init__(self, db_path, max_workers=4, interactive_workers=2, progress_interval=1.0):
+        self.db_path = db_path
+        self.progress_interval = progress_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._interactive_executor = ThreadPoolExecutor(max_workers=interactive_workers,
+                                                        thread_name_prefix='job-interactive')
+        self._lock = threading.Lock()
+        self._active = {}
+        self._live = {}
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._db() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    progress TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_key ON jobs (key)")
+            # Workers of a previous process are gone; their jobs will never finish
+            conn.execute(
+                "UPDATE jobs SET state = 'failed', error = 'Interrupted by a restart', updated_at = ? "
+                "WHERE state IN ('queued', 'running')",
+                (time.time(),)
+            )
+            conn.execute("DELETE FROM jobs WHERE updated_at < ?", (time.time() - JOB_RETENTION_SECONDS,))
+
+    @contextmanager
+    def _db(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def submit(self, kind, key, fn, interactive=False):
+        """
+        Queue fn(progress) and return the job id. progress(text) reports partial output;
+        the return value must be JSON serialisable.
+        """
+        key = f"{kind}:{key}"
+        now = time.time()
+        with self._lock:
+            if key in self._active:
+                return self._active[key]
+            job_id = uuid.uuid4().hex
+            self._active[key] = job_id
+            self._live[job_id] = {
+                'id': job_id,
+                'kind': kind,
+                'key': key,
+                'state': 'queued',
+                'progress': None,
+                'result': None,
+                'error': None,
+                'created_at': now,
+                'updated_at': now
+            }
+        with self._db() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, key, state, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, key, now, now)
+            )
+        executor = self._interactive_executor if interactive else self._executor
+        executor.submit(self._run, job_id, key, fn)
+        return job_id
+
+    def _update(self, job_id, persist=True, **fields):
+        fields['updated_at'] = time.time()
+        with self._lock:
+            self._live[job_id].update(fields)
+        if persist:
+            if 'result' in fields:
+                fields['result'] = json.dumps(fields['result'])
+            columns = ", ".join(f"{name} = ?" for name in fields)
+            with self._db() as conn:
+                conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def _run(self, job_id, key, fn):
+        with metrics.span(f"job.{self._live[job_id]['kind']}"):
+            self._execute(job_id, key, fn)
+
+    def _execute(self, job_id, key, fn):
+        self._update(job_id, state='running')
+        last_persisted = [0.0]
+
+        def progress(text):
+            # Sessions poll the in-memory copy; the database only needs an occasional snapshot
+            persist = time.time() - last_persisted[0] >= self.progress_interval
+            if persist:
+                last_persisted[0] = time.time()
+            self._update(job_id, persist=persist, progress=text)
+
+        try:
+            result = fn(progress)
+            self._update(job_id, state='success', result=result)
+        except Exception as e:
+            self._update(job_id, state='failed', error=str(e))
+        finally:
+            with self._lock:
+                self._active.pop(key, None)
+                self._live.pop(job_id, None)
+
+    def counts(self):
+        """
+        Number of jobs of this process per active state
+        """
+        with self._lock:
+            states = [job['state'] for job in self._live.values()]
+        return {state: states.count(state) for state in ACTIVE_STATES}
+
+    def get(self, job_id):
+        """
+        Current state of a job, or None if the id is unknown
+        """
+        with self._lock:
+            if job_id in self._live:
+                return dict(self._live[job_id])
+        with self._db() as conn:
+            row = conn.execute(
+                "SELECT id, kind, key, state, progress, result, error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(('id', 'kind', 'key', 'state', 'progress', 'result', 'error', 'created_at', 'updated_at'), row))
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
@@ -0,0 +1,295 @@
+import collections
+import functools
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Percentiles are computed over the most recent samples of each span
+SAMPLE_WINDOW = int(os.getenv("METRICS_SAMPLE_WINDOW", "512"))
+# Finished top-level spans (with their children) and log lines kept for the diagnostics views
+TRACE_HISTORY = int(os.getenv("METRICS_TRACE_HISTORY", "50"))
+LOG_HISTORY = int(os.getenv("METRICS_LOG_HISTORY", "200"))
+MAX_CHILDREN = 500
+TOKEN_FIELDS = (
+    ('prompt', 'prompt_token_count'),
+    ('output', 'candidates_token_count'),
+    ('total', 'total_token_count')
+)
+
+STARTED_AT = time.time()
+_lock = threading.Lock()
+_local = threading.local()
+_timings = {}
+_counters = collections.defaultdict(int)
+_tokens = collections.defaultdict(lambda: collections.defaultdict(int))
+_gauges = {}
+_traces = collections.deque(maxlen=TRACE_HISTORY)
+_log = collections.deque(maxlen=LOG_HISTORY)
+
+
+class _Timing:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.active = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = collections.deque(maxlen=SAMPLE_WINDOW)
+
+    def add(self, seconds, error=False):
+        self.count += 1
+        self.errors += error
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def summary(self):
+        ordered = sorted(self.recent)
+
+        def percentile(p):
+            if not ordered:
+                return 0.0
+            return ordered[min(int(round(p / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'active': self.active,
+            'total_seconds': self.total,
+            'mean_seconds': self.total / self.count if self.count else 0.0,
+            'p50_seconds': percentile(50),
+            'p95_seconds': percentile(95),
+            'max_seconds': self.max
+        }
+
+
+def _timing(name):
+    # Caller holds _lock
+    timing = _timings.get(name)
+    if timing is None:
+        timing = _timings[name] = _Timing()
+    return timing
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def observe(name, seconds, error=False):
+    """
+    Record a duration that was measured elsewhere
+    """
+    with _lock:
+        _timing(name).add(seconds, error)
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Time a block. Spans opened inside it (in this thread, or in workers via attach())
+    become its children; finished top-level spans are kept as traces.
+    """
+    stack = _stack()
+    parent = stack[-1] if stack else None
+    node = {'name': name, 'attrs': attrs, 'started_at': time.time(), 'seconds': None, 'error': None, 'children': [],
+            'operation': parent['operation'] if parent else name}
+    with _lock:
+        _timing(name).active += 1
+        if parent is not None and len(parent['children']) < MAX_CHILDREN:
+            parent['children'].append(node)
+    stack.append(node)
+    started = time.perf_counter()
+    try:
+        yield node
+    except Exception as e:
+        node['error'] = type(e).__name__
+        raise
+    finally:
+        node['seconds'] = time.perf_counter() - started
+        stack.pop()
+        with _lock:
+            timing = _timing(name)
+            timing.active -= 1
+            timing.add(node['seconds'], node['error'] is not None)
+            if parent is None:
+                _traces.append(node)
+
+
+def traced(name):
+    """
+    Decorator form of span()
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current():
+    """
+    Innermost open span of this thread (None outside any span), to hand to worker threads
+    """
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+@contextmanager
+def attach(parent):
+    """
+    Spans opened in this thread inside the block become children of `parent`
+    """
+    if parent is None:
+        yield
+        return
+    stack = _stack()
+    stack.append(parent)
+    try:
+        yield
+    finally:
+        stack.pop()
+
+
+def annotate(**attrs):
+    """
+    Add attributes to the innermost open span of this thread
+    """
+    node = current()
+    if node is not None:
+        with _lock:
+            node['attrs'].update(attrs)
+
+
+def incr(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+def set_gauge(name, value):
+    with _lock:
+        _gauges[name] = value
+
+
+def register_gauge(name, fn):
+    """
+    Gauge read by calling fn() whenever a snapshot is taken
+    """
+    with _lock:
+        _gauges[name] = fn
+
+
+def record_usage(response):
+    """
+    Count the tokens reported in a model response's usage_metadata, in total and
+    per operation (the name of the top-level span the call was made under)
+    """
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return
+    counts = {field: getattr(usage, attr, None) or 0 for field, attr in TOKEN_FIELDS}
+    stack = _stack()
+    operation = stack[-1]['operation'] if stack else 'other'
+    with _lock:
+        for field, value in counts.items():
+            _counters[f"gemini.tokens.{field}"] += value
+            _tokens[operation][field] += value
+        if stack:
+            stack[-1]['attrs'].update({f"{field}_tokens": value for field, value in counts.items()})
+
+
+def log(message):
+    """
+    Print a log line and keep it for the diagnostics views
+    """
+    line = f"{time.strftime('%Y-%m-%d %H:%M:%S')} {message}"
+    with _lock:
+        _log.append(line)
+    print(line, flush=True)
+
+
+def _copy_trace(node):
+    # Caller holds _lock; children of a running trace may still be appended
+    return {
+        'name': node['name'],
+        'attrs': dict(node['attrs']),
+        'started_at': node['started_at'],
+        'seconds': node['seconds'],
+        'error': node['error'],
+        'children': [_copy_trace(child) for child in node['children']]
+    }
+
+
+def snapshot():
+    """
+    Everything recorded so far, as plain JSON-serialisable data (traces newest first)
+    """
+    with _lock:
+        spans = {name: timing.summary() for name, timing in sorted(_timings.items())}
+        counters = dict(sorted(_counters.items()))
+        tokens = {operation: dict(fields) for operation, fields in sorted(_tokens.items())}
+        gauges = dict(_gauges)
+        traces = [_copy_trace(node) for node in reversed(_traces)]
+        log_lines = list(_log)
+    # Gauge callbacks may take their own locks, so they run outside ours
+    for name, value in gauges.items():
+        if callable(value):
+            try:
+                gauges[name] = value()
+            except Exception:
+                gauges[name] = None
+    return {
+        'uptime_seconds': time.time() - STARTED_AT,
+        'spans': spans,
+        'counters': counters,
+        'gauges': dict(sorted(gauges.items())),
+        'tokens': tokens,
+        'traces': traces,
+        'log': log_lines
+    }
+
+
+def _metric_name(prefix, name):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', f"{prefix}_{name}")
+
+
+def prometheus(prefix='smartclassroom'):
+    """
+    snapshot() in the Prometheus text exposition format
+    """
+    data = snapshot()
+    lines = []
+    for name, summary in data['spans'].items():
+        metric = _metric_name(prefix, name) + '_seconds'
+        lines.append(f"# TYPE {metric} summary")
+        lines.append(f'{metric}{{quantile="0.5"}} {summary["p50_seconds"]}')
+        lines.append(f'{metric}{{quantile="0.95"}} {summary["p95_seconds"]}')
+        lines.append(f"{metric}_sum {summary['total_seconds']}")
+        lines.append(f"{metric}_count {summary['count']}")
+        lines.append(f"# TYPE {metric}_errors counter")
+        lines.append(f"{metric}_errors {summary['errors']}")
+        lines.append(f"# TYPE {metric}_active gauge")
+        lines.append(f"{metric}_active {summary['active']}")
+    for name, value in data['counters'].items():
+        metric = _metric_name(prefix, name) + '_total'
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+    for name, value in data['gauges'].items():
+        if isinstance(value, (int, float)):
+            metric = _metric_name(prefix, name)
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value}")
+    if data['tokens']:
+        metric = _metric_name(prefix, 'gemini.operation_tokens') + '_total'
+        lines.append(f"# TYPE {metric} counter")
+        for operation, fields in data['tokens'].items():
+            for field, value in fields.items():
+                lines.append(f'{metric}{{operation="{operation}",type="{field}"}} {value}')
+    lines.append(f"{_metric_name(prefix, 'uptime_seconds')} {data['uptime_seconds']}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,53 @@
+import os
+import threading
+
+# Klien Gemini dan model dibuat sekali per proses; google.generativeai baru diimport saat pertama dipakai
+_genai = None
+_models = {}
+_lock = threading.Lock()
+# Fitur yang ditolak model (misalnya structured output), diingat sampai proses berhenti
+_unsupported = set()
+
+
+def client():
+    """
+    Modul google.generativeai yang sudah dikonfigurasi dengan API key
+    """
+    global _genai
+    with _lock:
+        if _genai is None:
+            import google.generativeai as genai
+            genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+            _genai = genai
+        return _genai
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def supports(model_name, feature):
+    return (model_name, feature) not in _unsupported
+
+
+def mark_unsupported(model_name, feature):
+    with _lock:
+        _unsupported.add((model_name, feature))
+
+
+def get_model(model_name, generation_config):
+    """
+    GenerativeModel bersama untuk kombinasi (model, konfigurasi) yang sama
+    """
+    key = (model_name, _freeze(generation_config))
+    with _lock:
+        model = _models.get(key)
+    if model is None:
+        model = client().GenerativeModel(model_name=model_name, generation_config=generation_config)
+        with _lock:
+            model = _models.setdefault(key, model)
+    return model
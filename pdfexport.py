@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+from fpdf import FPDF
+
+import cachedir
+
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join("cache", "pdf"))
+# Batas total ukuran PDF yang disimpan, file paling lama tidak dipakai dihapus duluan
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_MB", "200")) * 1024 * 1024
+
+# Font bawaan FPDF 1.7.2 hanya mendukung latin-1; karakter umum dari model diganti padanannya
+UNICODE_REPLACEMENTS = {
+    '‘': "'", '’': "'", '“': '"', '”': '"',
+    '–': '-', '—': '-', '•': '-', '●': '-',
+    '…': '...', ' ': ' ', '→': '->', '←': '<-',
+    '≤': '<=', '≥': '>=', '≠': '!=', '✓': 'v', '✔': 'v'
+}
+
+
+def latin1(text):
+    for char, replacement in UNICODE_REPLACEMENTS.items():
+        text = text.replace(char, replacement)
+    return text.encode('latin-1', 'replace').decode('latin-1')
+
+
+def content_key(kind, content):
+    """
+    Hash isi dokumen; dokumen dengan isi sama memakai PDF yang sama dari cache
+    """
+    return hashlib.sha256(json.dumps([kind, content], sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def cache_path(key):
+    return os.path.join(PDF_CACHE_DIR, f"{key}.pdf")
+
+
+def cached(key):
+    path = cache_path(key)
+    if not os.path.isfile(path):
+        return None
+    cachedir.touch(path)
+    return path
+
+
+class _Document(FPDF):
+    def __init__(self, title):
+        super().__init__()
+        self.title_text = latin1(title)
+        self.set_title(self.title_text)
+        self.set_auto_page_break(True, margin=15)
+        self.add_page()
+        self.set_font('Arial', 'B', 16)
+        self.multi_cell(0, 8, self.title_text)
+        self.ln(4)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Arial', 'I', 8)
+        self.cell(0, 10, f"Halaman {self.page_no()}", 0, 0, 'C')
+
+    def paragraph(self, text, style='', size=11, indent=0, height=6):
+        self.set_font('Arial', style, size)
+        left = self.l_margin
+        # multi_cell kembali ke margin kiri untuk baris berikutnya, jadi indentasi lewat margin
+        self.set_left_margin(left + indent)
+        self.set_x(left + indent)
+        self.multi_cell(0, height, latin1(text))
+        self.set_left_margin(left)
+
+    def output_bytes(self):
+        return self.output(dest='S').encode('latin-1')
+
+
+def _strip_inline(text):
+    return re.sub(r'(\*\*|__|`)', '', text)
+
+
+def render_text(title, text):
+    """
+    PDF dari teks markdown sederhana hasil model (judul #, daftar -, *, 1.)
+    """
+    pdf = _Document(title)
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            pdf.ln(3)
+            continue
+        heading = re.match(r'^(#{1,6})\s+(.*)$', stripped)
+        bullet = re.match(r'^[*\-+]\s+(.*)$', stripped)
+        numbered = re.match(r'^(\d+[.)])\s+(.*)$', stripped)
+        level = (len(line) - len(line.lstrip())) // 2
+        if heading:
+            size = {1: 15, 2: 14, 3: 13}.get(len(heading.group(1)), 12)
+            pdf.ln(2)
+            pdf.paragraph(_strip_inline(heading.group(2)), 'B', size, height=7)
+        elif bullet:
+            pdf.paragraph("- " + _strip_inline(bullet.group(1)), indent=4 + 5 * level)
+        elif numbered:
+            pdf.paragraph(f"{numbered.group(1)} {_strip_inline(numbered.group(2))}", indent=4 + 5 * level)
+        else:
+            pdf.paragraph(_strip_inline(stripped))
+    return pdf.output_bytes()
+
+
+def render_quiz(title, quiz_data, answer_key=False):
+    """
+    Lembar soal untuk dicetak, atau kunci jawaban beserta penjelasannya
+    """
+    pdf = _Document(title)
+    for i, question in enumerate(quiz_data['quiz'], start=1):
+        pdf.paragraph(f"{i}. {question['question']}", 'B')
+        if answer_key:
+            answer = question['correct_answer']
+            pdf.paragraph(f"Jawaban: {answer.upper()}. {question['options'][answer]}", indent=6)
+            if question.get('explanation'):
+                pdf.paragraph(f"Penjelasan: {question['explanation']}", 'I', 10, indent=6)
+        else:
+            for key, option in question['options'].items():
+                pdf.paragraph(f"{key.upper()}. {option}", indent=6)
+        pdf.ln(3)
+    return pdf.output_bytes()
+
+
+def export(key, kind, content):
+    """
+    Path PDF untuk isi ini, dirender dan disimpan ke cache jika belum ada.
+    kind 'text': {'title', 'text'}; kind 'quiz': {'title', 'quiz', 'answer_key'}
+    """
+    path = cached(key)
+    if path:
+        return path
+
+    if kind == 'quiz':
+        data = render_quiz(content['title'], content['quiz'], content.get('answer_key', False))
+    else:
+        data = render_text(content['title'], content['text'])
+
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=PDF_CACHE_DIR, suffix='.part')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    path = cache_path(key)
+    os.replace(tmp_path, path)
+    cachedir.evict(PDF_CACHE_DIR, PDF_CACHE_MAX_BYTES, suffix='.pdf')
+    return path
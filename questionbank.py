@@ -0,0 +1,161 @@
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import metrics
+from quizschema import OPTION_KEYS
+
+# Dua soal dianggap sama jika kemiripan kata pada pertanyaannya setinggi ini
+NEAR_DUPLICATE_THRESHOLD = 0.8
+
+
+def stem_tokens(question_text):
+    return frozenset(re.findall(r'\w+', question_text.casefold()))
+
+
+def is_near_duplicate(tokens, other_tokens):
+    if not tokens or not other_tokens:
+        return tokens == other_tokens
+    return len(tokens & other_tokens) / len(tokens | other_tokens) >= NEAR_DUPLICATE_THRESHOLD
+
+
+def shuffle_variant(quiz_data, seed):
+    """
+    Varian quiz per siswa: urutan soal dan opsi diacak dengan seed yang sama setiap kali,
+    kunci jawaban dipetakan ulang sehingga correct_text tetap benar
+    """
+    rng = random.Random(seed)
+    questions = [dict(q) for q in quiz_data['quiz']]
+    rng.shuffle(questions)
+    for question in questions:
+        texts = [question['options'][key] for key in OPTION_KEYS]
+        rng.shuffle(texts)
+        question['options'] = dict(zip(OPTION_KEYS, texts))
+        question['correct_answer'] = OPTION_KEYS[texts.index(question['correct_text'])]
+    return {**quiz_data, 'quiz': questions}
+
+
+class QuestionBank:
+    """
+    Pool soal per materi (hash) dan tingkat kesulitan. Pool diisi di background,
+    quiz dirakit dengan sampling dari pool tanpa memanggil model.
+    """
+
+    def __init__(self, db_path, max_workers=2):
+        self.db_path = db_path
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='question-bank')
+        self._filling = set()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._db() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS bank_questions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    material_hash TEXT NOT NULL,
+                    difficulty TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    created REAL NOT NULL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_bank_material ON bank_questions (material_hash, difficulty)"
+            )
+
+    @contextmanager
+    def _db(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def questions(self, material_hash, difficulty=None):
+        query = "SELECT data FROM bank_questions WHERE material_hash = ?"
+        params = [material_hash]
+        if difficulty is not None:
+            query += " AND difficulty = ?"
+            params.append(difficulty)
+        with self._db() as conn:
+            return [json.loads(data) for (data,) in conn.execute(query + " ORDER BY id", params)]
+
+    def count(self, material_hash, difficulty):
+        with self._db() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM bank_questions WHERE material_hash = ? AND difficulty = ?",
+                (material_hash, difficulty)
+            ).fetchone()[0]
+
+    def add_questions(self, material_hash, difficulty, questions):
+        """
+        Tambah soal ke pool, lewati soal yang pertanyaannya hampir sama dengan soal yang sudah ada
+        (untuk materi yang sama, semua tingkat kesulitan). Mengembalikan jumlah soal yang ditambahkan.
+        """
+        with self._write_lock:
+            known = [stem_tokens(q['question']) for q in self.questions(material_hash)]
+            rows = []
+            for question in questions:
+                tokens = stem_tokens(question['question'])
+                if any(is_near_duplicate(tokens, other) for other in known):
+                    continue
+                known.append(tokens)
+                rows.append((material_hash, difficulty, question['question'], json.dumps(question), time.time()))
+            with self._db() as conn:
+                conn.executemany(
+                    "INSERT INTO bank_questions (material_hash, difficulty, question, data, created) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+        return len(rows)
+
+    def assemble(self, material_hash, difficulty, num_questions, seed=None):
+        """
+        Rakit quiz dari pool; None jika pool belum cukup
+        """
+        pool = self.questions(material_hash, difficulty)
+        if len(pool) < num_questions:
+            return None
+        return {'quiz': random.Random(seed).sample(pool, num_questions)}
+
+    def is_filling(self, material_hash, difficulty):
+        with self._lock:
+            return (material_hash, difficulty) in self._filling
+
+    def fill_async(self, material_hash, difficulty, generate_fn, target, batch_size=10, max_batches=6):
+        """
+        Isi pool di background sampai target soal. generate_fn(count, existing) mengembalikan
+        daftar soal valid; hanya satu pengisian per (materi, tingkat kesulitan) yang berjalan.
+        """
+        key = (material_hash, difficulty)
+        with self._lock:
+            if key in self._filling:
+                return False
+            self._filling.add(key)
+
+        def run():
+            try:
+                for _ in range(max_batches):
+                    existing = self.questions(material_hash)
+                    missing = target - self.count(material_hash, difficulty)
+                    if missing <= 0:
+                        break
+                    batch = generate_fn(min(batch_size, missing), existing)
+                    self.add_questions(material_hash, difficulty, batch)
+            except Exception as e:
+                metrics.log(f"Error filling question bank ({difficulty}): {str(e)}")
+            finally:
+                with self._lock:
+                    self._filling.discard(key)
+
+        self._executor.submit(run)
+        return True
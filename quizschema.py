@@ -0,0 +1,137 @@
+import json
+import re
+
+import metrics
+
+OPTION_KEYS = ('a', 'b', 'c', 'd')
+
+QUESTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "question": {"type": "string"},
+        "options": {
+            "type": "object",
+            "properties": {key: {"type": "string"} for key in OPTION_KEYS},
+            "required": list(OPTION_KEYS)
+        },
+        "correct_answer": {"type": "string"},
+        "correct_text": {"type": "string"},
+        "explanation": {"type": "string"}
+    },
+    "required": ["question", "options", "correct_answer", "correct_text", "explanation"]
+}
+
+# Schema untuk structured output Gemini (response_schema)
+QUIZ_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "quiz": {"type": "array", "items": QUESTION_SCHEMA}
+    },
+    "required": ["quiz"]
+}
+
+
+def parse_quiz(text):
+    """
+    Parse response model menjadi dict quiz. Structured output sudah JSON murni;
+    untuk teks bebas ambil blok JSON pertama sampai terakhir.
+    """
+    try:
+        quiz_data = json.loads(text)
+    except json.JSONDecodeError:
+        json_str = re.search(r'\{[\s\S]*\}', text)
+        if not json_str:
+            raise ValueError("Tidak ditemukan format JSON yang valid dalam response.")
+        try:
+            quiz_data = json.loads(json_str.group())
+        except json.JSONDecodeError as e:
+            raise ValueError("Format JSON tidak valid atau tidak ditemukan dalam response.") from e
+
+    if not isinstance(quiz_data, dict) or not isinstance(quiz_data.get("quiz"), list):
+        raise ValueError("Response tidak berisi daftar 'quiz'.")
+    return quiz_data
+
+
+def _normalize(text):
+    return " ".join(str(text).split()).casefold()
+
+
+def repair_question(question):
+    """
+    Perbaiki kesalahan kecil tanpa memanggil model: huruf jawaban ("A", "a)")
+    dan correct_text yang hanya beda spasi/kapital atau menunjuk opsi lain secara persis
+    """
+    if not isinstance(question, dict) or not isinstance(question.get("options"), dict):
+        return question
+
+    options = question["options"]
+    answer = str(question.get("correct_answer", "")).strip().lower()[:1]
+    if answer in OPTION_KEYS:
+        question["correct_answer"] = answer
+
+    correct_text = question.get("correct_text")
+    if correct_text is None or correct_text == options.get(question["correct_answer"]):
+        return question
+
+    matches = [key for key in OPTION_KEYS if key in options and _normalize(options[key]) == _normalize(correct_text)]
+    if len(matches) == 1:
+        question["correct_answer"] = matches[0]
+        question["correct_text"] = options[matches[0]]
+    return question
+
+
+def validate_question(question):
+    """
+    Alasan soal tidak valid, atau None jika valid
+    """
+    if not isinstance(question, dict):
+        return "Soal bukan objek JSON"
+    if not str(question.get("question", "")).strip():
+        return "Pertanyaan kosong"
+    options = question.get("options")
+    if not isinstance(options, dict) or any(not str(options.get(key, "")).strip() for key in OPTION_KEYS):
+        return "Opsi harus berisi a, b, c, d"
+    if question.get("correct_answer") not in OPTION_KEYS:
+        return "Jawaban benar harus salah satu dari opsi: a, b, c, d"
+    if question.get("correct_text") != options.get(question["correct_answer"]):
+        return "Teks jawaban benar tidak cocok dengan opsi yang dipilih"
+    if len({_normalize(options[key]) for key in OPTION_KEYS}) < len(OPTION_KEYS):
+        return "Opsi jawaban ada yang sama"
+    return None
+
+
+def find_invalid_questions(questions):
+    """
+    Jalankan perbaikan lokal lalu kembalikan [(index, alasan)] untuk soal yang masih tidak valid
+    """
+    invalid = []
+    for i, question in enumerate(questions):
+        reason = validate_question(repair_question(question))
+        if reason:
+            invalid.append((i, reason))
+    return invalid
+
+
+def collect_valid_questions(questions, num_questions, request_more, rounds):
+    """
+    Buang soal yang tidak valid dan minta gantinya lewat request_more(jumlah, soal_yang_sudah_ada),
+    paling banyak `rounds` kali. ValueError jika sesudahnya masih ada soal yang tidak valid atau kurang.
+    """
+    for _ in range(rounds):
+        with metrics.span('quiz.validate'):
+            invalid = find_invalid_questions(questions)
+        invalid_indexes = {i for i, _ in invalid}
+        questions = [q for i, q in enumerate(questions) if i not in invalid_indexes][:num_questions]
+        missing = num_questions - len(questions)
+        if missing == 0:
+            return questions
+        metrics.incr('quiz.repaired', missing)
+        metrics.log(f"Memperbaiki {missing} soal: {[reason for _, reason in invalid]}")
+        questions += request_more(missing, questions)[:missing]
+
+    invalid = find_invalid_questions(questions)
+    if invalid:
+        raise ValueError(invalid[0][1])
+    if len(questions) < num_questions:
+        raise ValueError(f"Model hanya menghasilkan {len(questions)} dari {num_questions} soal valid")
+    return questions
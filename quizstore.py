@@ -0,0 +1,135 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class QuizStore:
+    """
+    Shared quiz storage backed by SQLite with an in-memory cache of hot quizzes.
+    Lookups by code hit the primary key; concurrent cold lookups of the same code
+    wait for a single load instead of each querying the database.
+    """
+
+    def __init__(self, db_path, cache_size=256):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._db() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS quizzes (
+                    code TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    material TEXT NOT NULL,
+                    difficulty TEXT NOT NULL,
+                    num_questions INTEGER NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_quizzes_created_at ON quizzes (created_at)")
+
+    @contextmanager
+    def _db(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _remember(self, code, quiz):
+        with self._lock:
+            self._cache[code] = quiz
+            self._cache.move_to_end(code)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def save(self, code, quiz):
+        with self._db() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO quizzes (code, data, material, difficulty, num_questions, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (code, json.dumps(quiz['data']), quiz['material'], quiz['difficulty'],
+                 quiz['num_questions'], quiz['created_at'])
+            )
+        self._remember(code, quiz)
+
+    def _load(self, code):
+        with self._db() as conn:
+            row = conn.execute(
+                "SELECT data, material, difficulty, num_questions, created_at FROM quizzes WHERE code = ?",
+                (code,)
+            ).fetchone()
+        if row is None:
+            return None
+        data, material, difficulty, num_questions, created_at = row
+        return {
+            'data': json.loads(data),
+            'material': material,
+            'difficulty': difficulty,
+            'num_questions': num_questions,
+            'created_at': created_at
+        }
+
+    def get(self, code):
+        """
+        Quiz for a code, or None if the code does not exist
+        """
+        with self._lock:
+            if code in self._cache:
+                self._cache.move_to_end(code)
+                return self._cache[code]
+            pending = self._loading.get(code)
+            if pending is None:
+                pending = self._loading[code] = {'event': threading.Event(), 'quiz': None}
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            pending['event'].wait()
+            return pending['quiz']
+
+        try:
+            pending['quiz'] = self._load(code)
+            if pending['quiz'] is not None:
+                self._remember(code, pending['quiz'])
+        finally:
+            with self._lock:
+                self._loading.pop(code, None)
+            pending['event'].set()
+        return pending['quiz']
+
+    def list(self, offset=0, limit=20):
+        """
+        One page of quiz summaries (without questions), newest first
+        """
+        with self._db() as conn:
+            rows = conn.execute(
+                "SELECT code, difficulty, num_questions, created_at FROM quizzes "
+                "ORDER BY created_at DESC, code ASC LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        return [{
+            'code': code,
+            'difficulty': difficulty,
+            'num_questions': num_questions,
+            'created_at': created_at
+        } for code, difficulty, num_questions, created_at in rows]
+
+    def count(self):
+        with self._db() as conn:
+            return conn.execute("SELECT COUNT(*) FROM quizzes").fetchone()[0]
+
+    def delete(self, code):
+        with self._db() as conn:
+            conn.execute("DELETE FROM quizzes WHERE code = ?", (code,))
+        with self._lock:
+            self._cache.pop(code, None)
@@ -0,0 +1,214 @@
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+
+import metrics
+
+# Project quota for the model; keep slightly below the real limit
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "15"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+BACKOFF_BASE_SECONDS = 2
+BACKOFF_MAX_SECONDS = 60
+
+# Lower value wins: a teacher waiting on a quiz goes before background module generation
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BATCH = 2
+
+# Token estimates used before the real usage is known; corrected from usage_metadata afterwards
+CHARS_PER_TOKEN = 4
+FILE_TOKEN_ESTIMATE = 32 * 600
+OUTPUT_TOKEN_ESTIMATE = 2048
+
+
+def _error_classes():
+    """
+    (throttled, retryable) exception types; google.api_core is imported on the first call, not at startup
+    """
+    from google.api_core import exceptions as google_exceptions
+    throttled = (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)
+    retryable = throttled + (
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.DeadlineExceeded
+    )
+    return throttled, retryable
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """
+        Seconds until `amount` can be taken (0 if it can be taken now)
+        """
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        # May go negative when real usage exceeds the estimate; later callers pay the debt
+        self.tokens -= amount
+
+    def drain(self):
+        self.tokens = min(self.tokens, 0)
+
+
+class RateLimiter:
+    """
+    Process-wide limiter for model calls. Requests and tokens per minute are token buckets;
+    the number of calls in flight adapts (halved on 429, grown back slowly on success).
+    Waiting callers are served strictly by priority, then in arrival order.
+    """
+
+    def __init__(self, rpm=GEMINI_RPM, tpm=GEMINI_TPM, max_concurrency=GEMINI_MAX_CONCURRENCY):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self._cond = threading.Condition()
+        self._queue = []
+        self._order = itertools.count()
+        self._in_flight = 0
+        self._successes = 0
+        self._paused_until = 0
+
+    def _acquire(self, priority, tokens):
+        ticket = (priority, next(self._order))
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            while True:
+                now = time.monotonic()
+                wait = None
+                if self._queue[0] == ticket and self._in_flight < self.concurrency:
+                    wait = max(self._paused_until - now,
+                               self.requests.wait_time(1, now),
+                               self.tokens.wait_time(tokens, now))
+                    if wait <= 0:
+                        heapq.heappop(self._queue)
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        self._in_flight += 1
+                        self._cond.notify_all()
+                        return
+                self._cond.wait(wait)
+
+    def _release(self, estimated, used=None, throttled=False, failed=False):
+        with self._cond:
+            self._in_flight -= 1
+            if used is not None:
+                self.tokens.take(used - estimated)
+            if throttled:
+                # Quota is exhausted: shrink concurrency and stop everyone until the buckets recover
+                self.concurrency = max(1, self.concurrency // 2)
+                self._successes = 0
+                self.requests.drain()
+            elif failed:
+                # Server errors and timeouts say nothing about spare quota; only successes grow concurrency
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.concurrency and self.concurrency < self.max_concurrency:
+                    self.concurrency += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'in_flight': self._in_flight,
+                'waiting': len(self._queue),
+                'concurrency': self.concurrency
+            }
+
+    def _pause(self, seconds):
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def call(self, fn, priority=PRIORITY_NORMAL, tokens=OUTPUT_TOKEN_ESTIMATE):
+        """
+        Run fn() within the limits, retrying retryable errors with exponential backoff and jitter.
+        If fn returns a response with usage_metadata, the token bucket is corrected with the real usage.
+        """
+        tokens = min(tokens, self.tokens.capacity)
+        throttled_errors, retryable_errors = _error_classes()
+        for attempt in range(MAX_RETRIES + 1):
+            queued = time.perf_counter()
+            self._acquire(priority, tokens)
+            metrics.observe('gemini.queue_wait', time.perf_counter() - queued)
+            try:
+                with metrics.span('gemini.generate', priority=priority, attempt=attempt):
+                    result = fn()
+                    metrics.record_usage(result)
+            except retryable_errors as e:
+                throttled = isinstance(e, throttled_errors)
+                metrics.incr('gemini.throttled' if throttled else 'gemini.retried_errors')
+                self._release(tokens, throttled=throttled, failed=True)
+                if attempt == MAX_RETRIES:
+                    raise
+                delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+                if throttled:
+                    self._pause(delay)
+                else:
+                    time.sleep(delay)
+                continue
+            except Exception:
+                self._release(tokens, failed=True)
+                raise
+            self._release(tokens, used=usage_tokens(result))
+            return result
+
+
+def usage_tokens(response):
+    usage = getattr(response, 'usage_metadata', None)
+    total = getattr(usage, 'total_token_count', None)
+    return total or None
+
+
+def estimate_tokens(contents):
+    """
+    Rough prompt size: text by character count, uploaded files by a fixed budget, plus expected output
+    """
+    def count(part):
+        if isinstance(part, str):
+            return len(part) // CHARS_PER_TOKEN
+        if isinstance(part, dict):
+            return sum(count(p) for p in part.get('parts', []))
+        if isinstance(part, (list, tuple)):
+            return sum(count(p) for p in part)
+        return FILE_TOKEN_ESTIMATE
+
+    return count(contents) + OUTPUT_TOKEN_ESTIMATE
+
+
+_limiter = RateLimiter()
+for _name in ('in_flight', 'waiting', 'concurrency'):
+    metrics.register_gauge(f"gemini.{_name}", lambda _name=_name: _limiter.stats()[_name])
+
+
+def generate(model, contents, priority=PRIORITY_NORMAL, **kwargs):
+    """
+    model.generate_content through the shared limiter
+    """
+    return _limiter.call(lambda: model.generate_content(contents, **kwargs), priority, estimate_tokens(contents))
+
+
+def call(fn, contents, priority=PRIORITY_NORMAL):
+    """
+    Run a custom model call (e.g. a streamed response consumed inside fn) through the shared limiter
+    """
+    return _limiter.call(fn, priority, estimate_tokens(contents))
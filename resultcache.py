@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "cache")
+CACHE_PATH = os.path.join(CACHE_DIR, "results.sqlite3")
+# Batas total ukuran hasil yang disimpan, entri paling lama tidak dipakai dibuang duluan
+MAX_CACHE_BYTES = int(os.getenv("RESULT_CACHE_MAX_MB", "200")) * 1024 * 1024
+
+_init_lock = threading.Lock()
+_initialized = False
+_registered_prompts = set()
+
+
+def _connect():
+    global _initialized
+    conn = sqlite3.connect(CACHE_PATH, timeout=30)
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS results (
+                        key TEXT PRIMARY KEY,
+                        kind TEXT NOT NULL,
+                        prompt_hash TEXT NOT NULL,
+                        value TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        accessed REAL NOT NULL
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_results_accessed ON results (accessed)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_results_kind ON results (kind, prompt_hash)")
+                conn.commit()
+                _initialized = True
+    return conn
+
+
+@contextmanager
+def _db():
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    conn = _connect()
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _hash_text(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def make_key(source_hash, prompt, model_name, generation_config, extra=None):
+    """
+    Kunci cache dari hash audio/materi, teks prompt, nama model, dan generation_config
+    """
+    payload = json.dumps({
+        'source': source_hash,
+        'prompt': _hash_text(prompt),
+        'model': model_name,
+        'config': generation_config,
+        'extra': extra
+    }, sort_keys=True)
+    return _hash_text(payload)
+
+
+def get(key):
+    """
+    Ambil hasil dari cache, None jika tidak ada
+    """
+    with _db() as conn:
+        row = conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            metrics.incr('resultcache.miss')
+            return None
+        conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+    metrics.incr('resultcache.hit')
+    return json.loads(row[0])
+
+
+def put(key, kind, prompt, value):
+    """
+    Simpan hasil ke cache lalu buang entri LRU jika melebihi batas ukuran
+    """
+    data = json.dumps(value)
+    with _db() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO results (key, kind, prompt_hash, value, size, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, kind, _hash_text(prompt), data, len(data.encode('utf-8')), time.time())
+        )
+        _evict(conn)
+
+
+def _evict(conn):
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+    if total <= MAX_CACHE_BYTES:
+        return
+    expired = []
+    for key, size in conn.execute("SELECT key, size FROM results ORDER BY accessed ASC"):
+        if total <= MAX_CACHE_BYTES:
+            break
+        expired.append((key,))
+        total -= size
+    conn.executemany("DELETE FROM results WHERE key = ?", expired)
+
+
+def invalidate(kind, prompt=None):
+    """
+    Hapus semua entri sebuah jenis hasil, atau hanya yang dibuat dengan prompt tertentu
+    """
+    with _db() as conn:
+        if prompt is None:
+            conn.execute("DELETE FROM results WHERE kind = ?", (kind,))
+        else:
+            conn.execute("DELETE FROM results WHERE kind = ? AND prompt_hash = ?", (kind, _hash_text(prompt)))
+
+
+def register_prompt(kind, prompt):
+    """
+    Tandai prompt yang sedang dipakai; entri dari versi prompt lama dihapus sekali per proses
+    """
+    prompt_hash = _hash_text(prompt)
+    if (kind, prompt_hash) in _registered_prompts:
+        return
+    with _db() as conn:
+        conn.execute("DELETE FROM results WHERE kind = ? AND prompt_hash != ?", (kind, prompt_hash))
+    _registered_prompts.add((kind, prompt_hash))
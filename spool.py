@@ -0,0 +1,126 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+
+import cachedir
+
+SPOOL_DIR = os.getenv("SPOOL_DIR", os.path.join(tempfile.gettempdir(), "smartclassroom-spool"))
+SPOOL_MAX_BYTES = int(os.getenv("SPOOL_MAX_MB", "2048")) * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+
+class SpoolLease:
+    """
+    Penanda file spool yang dipakai satu sesi Streamlit. Disimpan di session_state;
+    saat sesi berakhir dan objek ini dibuang, file yang tidak dipakai sesi lain ikut dihapus.
+    """
+
+    def __init__(self, spool):
+        self.id = uuid.uuid4().hex
+        self.spool = spool
+        weakref.finalize(self, spool.release_all, self.id)
+
+
+class Spool:
+    """
+    Folder sementara untuk audio upload dan rekaman yang diunduh. Nama file adalah hash isinya
+    sehingga upload ulang memakai file yang sama; total ukuran dibatasi dengan eviksi LRU
+    untuk file yang tidak sedang dipakai sesi mana pun.
+    """
+
+    def __init__(self, directory=SPOOL_DIR, max_bytes=SPOOL_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._holders = {}
+        self._last_used = {}
+        os.makedirs(directory, exist_ok=True)
+        # File dari proses sebelumnya tetap bisa dipakai ulang, urutan LRU dari mtime
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith('.part'):
+                os.remove(path)
+            elif os.path.isfile(path):
+                self._last_used[path] = os.path.getmtime(path)
+
+    def lease(self):
+        return SpoolLease(self)
+
+    def put_chunks(self, chunks, suffix, lease):
+        """
+        Tulis potongan bytes ke spool sambil di-hash, kembalikan path final
+        """
+        digest = hashlib.sha256()
+        fd, part_path = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    f.write(chunk)
+        except Exception:
+            os.remove(part_path)
+            raise
+
+        path = os.path.join(self.directory, digest.hexdigest() + suffix.lower())
+        with self._lock:
+            if os.path.exists(path):
+                os.remove(part_path)
+            else:
+                os.replace(part_path, path)
+            self._holders.setdefault(path, set()).add(lease.id)
+            self._last_used[path] = time.time()
+            self._evict()
+        return path
+
+    def put_file(self, fileobj, suffix, lease):
+        return self.put_chunks(iter(lambda: fileobj.read(CHUNK_SIZE), b''), suffix, lease)
+
+    def hold(self, path, lease):
+        """
+        Tandai file spool yang sudah ada sebagai dipakai lease ini juga (misalnya job di background),
+        False jika path bukan file spool
+        """
+        with self._lock:
+            if path not in self._last_used or not os.path.exists(path):
+                return False
+            self._holders.setdefault(path, set()).add(lease.id)
+            self._last_used[path] = time.time()
+            return True
+
+    def release(self, path, lease):
+        with self._lock:
+            holders = self._holders.get(path)
+            if holders is not None:
+                holders.discard(lease.id)
+                if not holders:
+                    self._remove(path)
+
+    def release_all(self, lease_id):
+        with self._lock:
+            for path in [p for p, holders in self._holders.items() if lease_id in holders]:
+                self._holders[path].discard(lease_id)
+                if not self._holders[path]:
+                    self._remove(path)
+
+    def _remove(self, path):
+        self._holders.pop(path, None)
+        self._last_used.pop(path, None)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        files = []
+        for path, last_used in list(self._last_used.items()):
+            try:
+                files.append((last_used, os.path.getsize(path), path))
+            except FileNotFoundError:
+                self._last_used.pop(path)
+        # File yang masih dipegang lease tidak dihapus walau paling lama
+        for path in cachedir.victims(files, self.max_bytes, keep=self._holders.get):
+            self._remove(path)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Appended, not prepended: the repo's flask.py must not shadow the real flask package
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.append(REPO_ROOT)
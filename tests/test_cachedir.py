@@ -0,0 +1,59 @@
+import os
+import time
+
+import cachedir
+from spool import Spool
+
+
+def cache_file(directory, name, size, age):
+    path = os.path.join(str(directory), name)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    used = time.time() - age
+    os.utime(path, (used, used))
+    return path
+
+
+def test_evict_removes_least_recently_used_first(tmp_path):
+    oldest = cache_file(tmp_path, 'a.pdf', 10, age=300)
+    middle = cache_file(tmp_path, 'b.pdf', 10, age=200)
+    newest = cache_file(tmp_path, 'c.pdf', 10, age=100)
+    cachedir.touch(oldest)
+
+    assert cachedir.evict(str(tmp_path), 20) == [middle]
+    assert sorted(os.listdir(str(tmp_path))) == ['a.pdf', 'c.pdf']
+    assert os.path.exists(newest)
+
+
+def test_evict_skips_partial_and_other_files(tmp_path):
+    cache_file(tmp_path, 'writing.part', 100, age=300)
+    cache_file(tmp_path, 'other.json', 100, age=300)
+    kept = cache_file(tmp_path, 'a.pdf', 10, age=200)
+
+    assert cachedir.evict(str(tmp_path), 5, suffix='.pdf') == [kept]
+    assert sorted(os.listdir(str(tmp_path))) == ['other.json', 'writing.part']
+
+
+def test_evict_keeps_recently_used_files_over_the_limit(tmp_path):
+    old = cache_file(tmp_path, 'old.wav', 10, age=3600)
+    cache_file(tmp_path, 'recent.wav', 10, age=60)
+
+    assert cachedir.evict(str(tmp_path), 0, min_age=600) == [old]
+
+
+def test_victims_skips_kept_paths():
+    files = [(1, 10, 'held'), (2, 10, 'free'), (3, 10, 'newest')]
+    assert cachedir.victims(files, 20, keep=lambda path: path == 'held') == ['free']
+
+
+def test_spool_evicts_unheld_files_before_held_ones(tmp_path):
+    # Left over from a previous process, so no lease holds it
+    leftover = cache_file(tmp_path, 'leftover.wav', 10, age=60)
+    spool = Spool(str(tmp_path), max_bytes=15)
+    leases = [spool.lease(), spool.lease()]
+    held = spool.put_chunks([b'a' * 10], '.wav', leases[0])
+    assert not os.path.exists(leftover)
+
+    # Over the limit, but every remaining file is held
+    newest = spool.put_chunks([b'b' * 10], '.wav', leases[1])
+    assert os.path.exists(held) and os.path.exists(newest)
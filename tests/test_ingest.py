@@ -0,0 +1,96 @@
+import io
+import os
+import struct
+import time
+
+import pytest
+
+import ingest
+from ingest import InvalidUpload, OffsetMismatch, UploadTooLarge
+
+
+def wav_bytes(data=b'\x00\x00' * 100, extra_chunk=None, data_first=False):
+    fmt = b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 1, 16000, 32000, 2, 16)
+    data_chunk = b'data' + struct.pack('<I', len(data)) + data
+    chunks = (data_chunk + fmt) if data_first else (fmt + data_chunk)
+    if extra_chunk:
+        chunks = extra_chunk + chunks
+    return b'RIFF' + struct.pack('<I', 4 + len(chunks)) + b'WAVE' + chunks
+
+
+def write(path, content):
+    with open(path, 'wb') as f:
+        f.write(content)
+    return str(path)
+
+
+def test_append_chunk_commits_and_resumes(tmp_path):
+    session = ingest.create_session(str(tmp_path), 'a.wav')
+    upload_id = session['upload_id']
+
+    assert ingest.append_chunk(str(tmp_path), upload_id, 0, io.BytesIO(b'abcd'), 100, chunk_size=3) == 4
+    assert ingest.append_chunk(str(tmp_path), upload_id, 4, io.BytesIO(b'ef'), 100) == 6
+    assert ingest.load_session(str(tmp_path), upload_id)['offset'] == 6
+
+
+def test_append_chunk_offset_mismatch(tmp_path):
+    upload_id = ingest.create_session(str(tmp_path), 'a.wav')['upload_id']
+    ingest.append_chunk(str(tmp_path), upload_id, 0, io.BytesIO(b'abcd'), 100)
+
+    with pytest.raises(OffsetMismatch) as excinfo:
+        ingest.append_chunk(str(tmp_path), upload_id, 2, io.BytesIO(b'cd'), 100)
+    assert excinfo.value.expected == 4
+    assert ingest.load_session(str(tmp_path), upload_id)['offset'] == 4
+
+
+def test_append_chunk_over_limit_keeps_earlier_requests(tmp_path):
+    upload_id = ingest.create_session(str(tmp_path), 'a.wav', total_size=10)['upload_id']
+    ingest.append_chunk(str(tmp_path), upload_id, 0, io.BytesIO(b'abcd'), 100)
+
+    with pytest.raises(UploadTooLarge):
+        ingest.append_chunk(str(tmp_path), upload_id, 4, io.BytesIO(b'efghijklmn'), 100, chunk_size=2)
+
+    part_path = os.path.join(str(tmp_path), upload_id + '.part')
+    with open(part_path, 'rb') as f:
+        assert f.read() == b'abcd'
+    assert ingest.load_session(str(tmp_path), upload_id)['offset'] == 4
+
+
+def test_validate_wav_accepts_complete_file(tmp_path):
+    content = wav_bytes(extra_chunk=b'LIST' + struct.pack('<I', 3) + b'abc\x00')
+    assert ingest.validate_wav(write(tmp_path / 'a.wav', content), len(content))
+
+
+@pytest.mark.parametrize('content, message', [
+    (b'RIFX' + wav_bytes()[4:], 'not a RIFF/WAVE'),
+    (wav_bytes()[:-10], 'does not match'),
+    (wav_bytes(data_first=True), 'before fmt'),
+    (wav_bytes()[:40], 'does not match'),
+])
+def test_validate_wav_rejects(tmp_path, content, message):
+    path = write(tmp_path / 'a.wav', content)
+    with pytest.raises(InvalidUpload, match=message):
+        ingest.validate_wav(path, len(content))
+
+
+def test_validate_wav_rejects_truncated_data_chunk(tmp_path):
+    content = wav_bytes()
+    # Header claims the full length but the data chunk runs past it
+    content = content[:4] + struct.pack('<I', len(content) - 8 - 20) + content[8:-20]
+    with pytest.raises(InvalidUpload, match='longer than the received file'):
+        ingest.validate_wav(write(tmp_path / 'a.wav', content), len(content))
+
+
+def test_expire_sessions_removes_only_idle_uploads(tmp_path):
+    incoming = str(tmp_path)
+    stale = ingest.create_session(incoming, 'old.wav')['upload_id']
+    active = ingest.create_session(incoming, 'new.wav')['upload_id']
+    orphan = write(tmp_path / 'tmpabc.part', b'x')
+    old = time.time() - 7200
+    for path in (os.path.join(incoming, stale + '.part'), os.path.join(incoming, stale + '.json'), orphan):
+        os.utime(path, (old, old))
+    # Metadata is written once; a recent append keeps the session alive
+    os.utime(os.path.join(incoming, active + '.json'), (old, old))
+
+    assert sorted(ingest.expire_sessions(incoming, 3600)) == sorted([stale, 'tmpabc'])
+    assert sorted(os.listdir(incoming)) == sorted([active + '.part', active + '.json'])
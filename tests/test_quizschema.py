@@ -0,0 +1,141 @@
+import json
+
+import pytest
+
+from quizschema import (
+    collect_valid_questions, find_invalid_questions, parse_quiz, repair_question, validate_question
+)
+
+
+def question(n, **overrides):
+    options = {key: f"Pilihan {key} soal {n}" for key in 'abcd'}
+    data = {
+        'question': f"Pertanyaan {n}?",
+        'options': options,
+        'correct_answer': 'b',
+        'correct_text': options['b'],
+        'explanation': "Karena begitu."
+    }
+    data.update(overrides)
+    return data
+
+
+def unrepairable(n):
+    return question(n, correct_answer='e', correct_text="Tidak ada di opsi")
+
+
+def test_parse_quiz_accepts_plain_and_wrapped_json():
+    payload = {'quiz': [question(1)]}
+    assert parse_quiz(json.dumps(payload)) == payload
+    assert parse_quiz(f"Berikut soalnya:\n```json\n{json.dumps(payload)}\n```") == payload
+
+
+@pytest.mark.parametrize('text', ["tidak ada json", '{"quiz": [}', '{"soal": []}', '[1, 2]'])
+def test_parse_quiz_rejects(text):
+    with pytest.raises(ValueError):
+        parse_quiz(text)
+
+
+@pytest.mark.parametrize('answer', ['B', ' b ', 'b)', 'B. Pilihan b'])
+def test_repair_normalises_answer_letter(answer):
+    repaired = repair_question(question(1, correct_answer=answer))
+    assert repaired['correct_answer'] == 'b'
+    assert validate_question(repaired) is None
+
+
+def test_repair_matches_correct_text_ignoring_whitespace_and_case():
+    repaired = repair_question(question(1, correct_text="  pilihan B   soal 1 "))
+    assert repaired['correct_answer'] == 'b'
+    assert repaired['correct_text'] == "Pilihan b soal 1"
+
+
+def test_repair_follows_correct_text_to_another_option():
+    repaired = repair_question(question(1, correct_answer='a', correct_text="Pilihan c soal 1"))
+    assert repaired['correct_answer'] == 'c'
+    assert validate_question(repaired) is None
+
+
+def test_repair_leaves_ambiguous_or_unknown_text_alone():
+    options = {'a': "Sama", 'b': "sama", 'c': "Lain", 'd': "Beda"}
+    ambiguous = repair_question(question(1, options=options, correct_answer='c', correct_text="SAMA"))
+    assert ambiguous['correct_answer'] == 'c'
+
+    unknown = repair_question(question(2, correct_text="Jawaban yang tidak ada"))
+    assert validate_question(unknown) == "Teks jawaban benar tidak cocok dengan opsi yang dipilih"
+
+
+@pytest.mark.parametrize('overrides, reason', [
+    ({'question': "  "}, "Pertanyaan kosong"),
+    ({'options': {'a': "1", 'b': "2", 'c': "3"}}, "Opsi harus berisi a, b, c, d"),
+    ({'correct_answer': 'e'}, "Jawaban benar harus salah satu dari opsi: a, b, c, d"),
+    ({'options': {'a': "Satu", 'b': "Dua", 'c': "satu ", 'd': "Tiga"}, 'correct_text': "Dua"},
+     "Opsi jawaban ada yang sama"),
+])
+def test_validate_question_reasons(overrides, reason):
+    assert validate_question(question(1, **overrides)) == reason
+
+
+def test_validate_question_rejects_non_objects():
+    assert validate_question("soal") == "Soal bukan objek JSON"
+
+
+def test_find_invalid_questions_repairs_first():
+    questions = [question(1, correct_answer='B'), question(2, correct_answer='x'), unrepairable(3), question(4, question="")]
+    assert find_invalid_questions(questions) == [
+        (2, "Jawaban benar harus salah satu dari opsi: a, b, c, d"),
+        (3, "Pertanyaan kosong")
+    ]
+    # Letter normalised, and an unknown letter recovered from correct_text
+    assert [q['correct_answer'] for q in questions[:2]] == ['b', 'b']
+
+
+class StubRequest:
+    """
+    Stands in for app.request_questions: returns prepared batches and records each request
+    """
+
+    def __init__(self, *batches):
+        self.batches = list(batches)
+        self.requests = []
+
+    def __call__(self, count, existing):
+        self.requests.append((count, [q['question'] for q in existing]))
+        return self.batches.pop(0)
+
+
+def test_collect_keeps_valid_questions_without_requests():
+    request = StubRequest()
+    questions = [question(n) for n in range(3)]
+    assert collect_valid_questions(questions, 3, request, rounds=2) == questions
+    assert request.requests == []
+
+
+def test_collect_trims_extra_questions():
+    assert len(collect_valid_questions([question(n) for n in range(5)], 3, StubRequest(), rounds=2)) == 3
+
+
+def test_collect_replaces_only_invalid_questions():
+    request = StubRequest([question(10)])
+    questions = [question(1), unrepairable(2), question(3)]
+
+    result = collect_valid_questions(questions, 3, request, rounds=2)
+
+    assert [q['question'] for q in result] == ["Pertanyaan 1?", "Pertanyaan 3?", "Pertanyaan 10?"]
+    # The model is told which questions already exist so it does not repeat them
+    assert request.requests == [(1, ["Pertanyaan 1?", "Pertanyaan 3?"])]
+
+
+def test_collect_refills_short_batches_over_several_rounds():
+    request = StubRequest([question(2, question="")], [question(3)])
+    result = collect_valid_questions([question(1)], 2, request, rounds=2)
+    assert [q['question'] for q in result] == ["Pertanyaan 1?", "Pertanyaan 3?"]
+    assert [count for count, _ in request.requests] == [1, 1]
+
+
+def test_collect_gives_up_after_rounds():
+    request = StubRequest([unrepairable(2)], [unrepairable(3)])
+    with pytest.raises(ValueError, match="Jawaban benar harus salah satu"):
+        collect_valid_questions([question(1)], 2, request, rounds=2)
+
+    with pytest.raises(ValueError, match="1 dari 2 soal valid"):
+        collect_valid_questions([question(1)], 2, StubRequest([], []), rounds=2)
@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+import ratelimit
+from ratelimit import PRIORITY_BATCH, PRIORITY_INTERACTIVE, PRIORITY_NORMAL, RateLimiter
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(ratelimit, 'BACKOFF_BASE_SECONDS', 0.001)
+    monkeypatch.setattr(ratelimit, 'BACKOFF_MAX_SECONDS', 0.001)
+
+
+def limiter(max_concurrency=8):
+    return RateLimiter(rpm=100000, tpm=10 ** 9, max_concurrency=max_concurrency)
+
+
+def failing(error, times):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) <= times:
+            raise error
+        return 'ok'
+    return fn, calls
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_waiting_callers_are_served_by_priority_then_arrival():
+    rl = limiter(max_concurrency=1)
+    gate = threading.Event()
+    order = []
+    holder = threading.Thread(target=rl.call, args=(gate.wait,))
+    holder.start()
+    wait_for(lambda: rl.stats()['in_flight'] == 1)
+
+    threads = []
+    for name, priority in [('batch', PRIORITY_BATCH), ('normal-1', PRIORITY_NORMAL),
+                           ('interactive', PRIORITY_INTERACTIVE), ('normal-2', PRIORITY_NORMAL)]:
+        thread = threading.Thread(target=rl.call, args=(lambda name=name: order.append(name), priority))
+        thread.start()
+        threads.append(thread)
+        wait_for(lambda count=len(threads): rl.stats()['waiting'] == count)
+
+    gate.set()
+    for thread in [holder] + threads:
+        thread.join(5)
+    assert order == ['interactive', 'normal-1', 'normal-2', 'batch']
+
+
+def test_throttling_halves_concurrency_and_retries():
+    rl = limiter(max_concurrency=8)
+    fn, calls = failing(google_exceptions.ResourceExhausted('quota'), times=2)
+
+    assert rl.call(fn) == 'ok'
+    assert len(calls) == 3
+    assert rl.concurrency == 2
+    assert rl.stats()['in_flight'] == 0
+
+
+def test_successes_grow_concurrency_back():
+    rl = limiter(max_concurrency=8)
+    rl.concurrency = 2
+    for _ in range(2):
+        rl.call(lambda: 'ok')
+    assert rl.concurrency == 3
+
+
+def test_server_errors_do_not_grow_concurrency():
+    rl = limiter(max_concurrency=8)
+    rl.concurrency = 2
+    fn, calls = failing(google_exceptions.ServiceUnavailable('down'), times=ratelimit.MAX_RETRIES + 1)
+
+    with pytest.raises(google_exceptions.ServiceUnavailable):
+        rl.call(fn)
+    assert len(calls) == ratelimit.MAX_RETRIES + 1
+    assert rl.concurrency == 2
+
+    # A failure also breaks the streak of successes
+    rl.call(lambda: 'ok')
+    with pytest.raises(google_exceptions.DeadlineExceeded):
+        rl.call(failing(google_exceptions.DeadlineExceeded('slow'), times=ratelimit.MAX_RETRIES + 1)[0])
+    rl.call(lambda: 'ok')
+    assert rl.concurrency == 2
+
+
+@pytest.mark.parametrize('error', [google_exceptions.InvalidArgument('bad'), ValueError('parse')])
+def test_non_retryable_errors_pass_through(error):
+    rl = limiter(max_concurrency=2)
+    fn, calls = failing(error, times=1)
+
+    with pytest.raises(type(error)):
+        rl.call(fn)
+    assert len(calls) == 1
+    assert rl.stats() == {'in_flight': 0, 'waiting': 0, 'concurrency': 2}
+
+
+def test_token_bucket_is_corrected_with_real_usage():
+    rl = RateLimiter(rpm=100000, tpm=10000, max_concurrency=1)
+
+    class Response:
+        usage_metadata = type('Usage', (), {'total_token_count': 3000})()
+
+    rl.call(Response, tokens=1000)
+    assert rl.tokens.tokens == pytest.approx(7000, abs=50)
@@ -0,0 +1,81 @@
+import os
+import wave
+
+import numpy as np
+import pytest
+
+import vad
+
+RATE = 16000
+
+
+def write_wav(path, samples):
+    with wave.open(str(path), 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes(np.asarray(samples).clip(-32768, 32767).astype('<i2').tobytes())
+    return str(path)
+
+
+def tone(seconds, amplitude=6000):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return amplitude * np.sin(2 * np.pi * 220 * t)
+
+
+def noise(seconds, sigma=30, seed=0):
+    return np.random.default_rng(seed).normal(0, sigma, int(seconds * RATE))
+
+
+def test_kept_spans_all_speech():
+    assert vad.kept_spans(np.ones(100, dtype=bool), 10, 4) == [(0, 100)]
+
+
+def test_kept_spans_all_silence():
+    assert vad.kept_spans(np.zeros(100, dtype=bool), 10, 4) == []
+
+
+def test_kept_spans_compresses_long_silence_only():
+    mask = np.array([True] * 20 + [False] * 5 + [True] * 20 + [False] * 30 + [True] * 25)
+    # The 5-frame pause stays; the 30-frame pause keeps 2 frames on each side
+    assert vad.kept_spans(mask, 10, 4) == [(0, 47), (73, 100)]
+
+
+def test_kept_spans_edges_keep_only_the_side_next_to_speech():
+    mask = np.array([False] * 30 + [True] * 40 + [False] * 30)
+    assert vad.kept_spans(mask, 10, 4) == [(28, 72)]
+
+
+def test_trim_all_silence_uses_original(tmp_path):
+    path = write_wav(tmp_path / 'silent.wav', np.zeros(10 * RATE))
+    out_path = str(tmp_path / 'out.wav')
+    assert vad.trim(path, out_path) is None
+    assert not os.path.exists(out_path)
+
+
+def test_trim_all_speech_uses_original(tmp_path):
+    path = write_wav(tmp_path / 'speech.wav', tone(10))
+    out_path = str(tmp_path / 'out.wav')
+    assert vad.trim(path, out_path) is None
+    assert not os.path.exists(out_path)
+
+
+def test_trim_maps_back_to_original(tmp_path):
+    samples = np.concatenate((tone(5), noise(20), tone(5)))
+    path = write_wav(tmp_path / 'lesson.wav', samples + noise(30, seed=1))
+    out_path = str(tmp_path / 'out.wav')
+    timemap = vad.trim(path, out_path)
+
+    assert timemap['original_seconds'] == pytest.approx(30)
+    assert timemap['trimmed_seconds'] == pytest.approx(10 + vad.VAD_KEEP_SILENCE_SECONDS, abs=0.1)
+    with wave.open(out_path, 'rb') as wav:
+        assert wav.getnframes() / RATE == pytest.approx(timemap['trimmed_seconds'])
+    # The second tone starts at 25 s in the original
+    assert vad.to_original(timemap, timemap['trimmed_seconds'] - 5) == pytest.approx(25, abs=0.1)
+
+
+def test_trimmed_skips_non_wav(tmp_path, monkeypatch):
+    monkeypatch.setattr(vad, 'VAD_CACHE_DIR', str(tmp_path / 'cache'))
+    path = tmp_path / 'lesson.mp3'
+    path.write_bytes(b'ID3' + b'\0' * 100)
+    assert vad.trimmed(str(path), 'digest') is None
@@ -0,0 +1,223 @@
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# flac = lossless archive, opus = speech-optimized (much smaller, lossy)
+FORMATS = {
+    'flac': {'ext': 'flac', 'mimetype': 'audio/flac', 'args': ['-c:a', 'flac', '-compression_level', '8', '-f', 'flac']},
+    'opus': {'ext': 'ogg', 'mimetype': 'audio/ogg', 'args': ['-c:a', 'libopus', '-b:a', '24k', '-application', 'voip', '-f', 'ogg']}
+}
+
+
+def ffmpeg_available():
+    return shutil.which('ffmpeg') is not None
+
+
+def transcode(src_path, dst_path, fmt='flac'):
+    """
+    Transcode one file with ffmpeg, writing to a temp file and renaming it into place
+    """
+    return _ffmpeg(src_path, dst_path, FORMATS[fmt]['args'])
+
+
+def decode_wav(src_path, dst_path):
+    """
+    Decode a compressed recording back to 16-bit PCM WAV (for trimming and segmenting)
+    """
+    return _ffmpeg(src_path, dst_path, ['-c:a', 'pcm_s16le', '-f', 'wav'])
+
+
+def _ffmpeg(src_path, dst_path, args):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dst_path), suffix='.part')
+    os.close(fd)
+    command = ['ffmpeg', '-y', '-loglevel', 'error', '-i', src_path] + args + [tmp_path]
+    try:
+        subprocess.run(command, check=True, capture_output=True)
+        os.replace(tmp_path, dst_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return dst_path
+
+
+def find_variant(upload_folder, name, fmt):
+    """
+    Path of the compressed variant of a recording, or None if it does not exist (yet)
+    or is older than a re-uploaded original
+    """
+    path = os.path.join(upload_folder, '.compressed', f"{name}.{FORMATS[fmt]['ext']}")
+    if not os.path.isfile(path):
+        return None
+    original = os.path.join(upload_folder, name)
+    if os.path.isfile(original) and os.path.getmtime(original) > os.path.getmtime(path):
+        return None
+    return path
+
+
+def _try_lock(path):
+    """
+    Open path and take a non-blocking exclusive lock on it; returns the open file
+    (the lock lives as long as it stays open) or None if another process holds it
+    """
+    f = open(path, 'a+')
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+class Transcoder:
+    """
+    Background worker that keeps a compressed variant next to every ingested WAV.
+    Variants live in <upload_folder>/.compressed/<original name>.<ext>.
+    Only one server process (gunicorn worker, reloader parent/child) runs the worker;
+    it rescans the upload folder when idle to pick up recordings ingested by the others.
+    """
+
+    def __init__(self, upload_folder, fmt='flac', retain_original_days=None):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown transcode format: {fmt}")
+        self.upload_folder = upload_folder
+        self.variant_folder = os.path.join(upload_folder, '.compressed')
+        self.fmt = fmt
+        self.retain_original_days = retain_original_days
+        self.enabled = ffmpeg_available()
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock_file = None
+        os.makedirs(self.variant_folder, exist_ok=True)
+        if not self.enabled:
+            metrics.log("ffmpeg not found, recordings will be stored uncompressed")
+
+    @property
+    def mimetype(self):
+        return FORMATS[self.fmt]['mimetype']
+
+    def variant_name(self, name):
+        return f"{name}.{FORMATS[self.fmt]['ext']}"
+
+    def variant_path(self, name):
+        return find_variant(self.upload_folder, name, self.fmt)
+
+    def original_name(self, variant_name):
+        suffix = '.' + FORMATS[self.fmt]['ext']
+        return variant_name[:-len(suffix)] if variant_name.endswith(suffix) else None
+
+    def failure_path(self, name):
+        return os.path.join(self.variant_folder, f"{name}.failed")
+
+    def failed(self, name):
+        """
+        True if ffmpeg already failed on the current contents of this original
+        """
+        marker = self.failure_path(name)
+        original = os.path.join(self.upload_folder, name)
+        try:
+            return os.path.getmtime(marker) >= os.path.getmtime(original)
+        except OSError:
+            return False
+
+    def enqueue(self, name):
+        if self._worker is not None and name.lower().endswith('.wav'):
+            self._queue.put(name)
+
+    def pending(self):
+        """
+        Recordings waiting to be transcoded
+        """
+        return self._queue.qsize()
+
+    def enqueue_missing(self):
+        """
+        Queue every original that has no compressed variant yet, skipping files ffmpeg
+        already failed on (retried once the original is replaced)
+        """
+        for entry in os.scandir(self.upload_folder):
+            if entry.name.startswith('.') or not entry.is_file():
+                continue
+            if not self.variant_path(entry.name) and not self.failed(entry.name):
+                self.enqueue(entry.name)
+
+    def _process(self, name):
+        src_path = os.path.join(self.upload_folder, name)
+        if not os.path.isfile(src_path):
+            return
+        dst_path = os.path.join(self.variant_folder, self.variant_name(name))
+        started = time.time()
+        marker = self.failure_path(name)
+        try:
+            with metrics.span('transcode', format=self.fmt):
+                transcode(src_path, dst_path, self.fmt)
+        except Exception as e:
+            # Marker keeps the idle rescan from retrying a file ffmpeg cannot read
+            detail = e.stderr.decode('utf-8', 'replace') if isinstance(e, subprocess.CalledProcessError) else str(e)
+            with open(marker, 'w') as f:
+                f.write(detail)
+            raise
+        if os.path.exists(marker):
+            os.remove(marker)
+        original_size = os.path.getsize(src_path)
+        variant_size = os.path.getsize(dst_path)
+        metrics.log(f"Transcoded {name}: {original_size} -> {variant_size} bytes "
+              f"({variant_size / max(original_size, 1):.0%}) in {time.time() - started:.1f}s")
+
+    def apply_retention(self):
+        """
+        Delete originals older than the retention period once a compressed variant exists
+        """
+        if not self.retain_original_days:
+            return []
+        cutoff = time.time() - self.retain_original_days * 24 * 60 * 60
+        removed = []
+        for entry in os.scandir(self.upload_folder):
+            if entry.name.startswith('.') or not entry.is_file():
+                continue
+            if entry.stat().st_mtime < cutoff and self.variant_path(entry.name):
+                os.remove(entry.path)
+                removed.append(entry.name)
+                metrics.log(f"Retention: removed original {entry.name}, keeping compressed variant")
+        return removed
+
+    def start(self):
+        if not self.enabled or self._worker is not None:
+            return
+        self._lock_file = _try_lock(os.path.join(self.variant_folder, '.worker.lock'))
+        if self._lock_file is None:
+            return
+
+        def run():
+            while True:
+                try:
+                    name = self._queue.get(timeout=60)
+                except queue.Empty:
+                    self.enqueue_missing()
+                    continue
+                try:
+                    self._process(name)
+                except Exception as e:
+                    metrics.log(f"Error transcoding {name}: {str(e)}")
+                finally:
+                    self._queue.task_done()
+
+        self._worker = threading.Thread(target=run, name='transcoder', daemon=True)
+        self._worker.start()
+        self.enqueue_missing()
@@ -0,0 +1,235 @@
+import bisect
+import hashlib
+import json
+import os
+import tempfile
+import wave
+
+import cachedir
+from audiosegments import stage_lock
+
+VAD_ENABLED = os.getenv("VAD_ENABLED", "1") == "1"
+# Panjang frame analisis energi
+VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", "30"))
+# Jeda hening yang lebih panjang dari ini dipadatkan; jeda antar kalimat tetap utuh
+VAD_MIN_SILENCE_SECONDS = float(os.getenv("VAD_MIN_SILENCE_SECONDS", "2.0"))
+# Sisa hening yang dipertahankan dari tiap jeda panjang (0 = dibuang seluruhnya)
+VAD_KEEP_SILENCE_SECONDS = float(os.getenv("VAD_KEEP_SILENCE_SECONDS", "0.5"))
+# Frame dianggap suara jika energinya sekian dB di atas lantai derau rekaman
+VAD_MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", "10"))
+# Batas ambang (dBFS): di bawah batas bawah selalu hening, ruang kelas yang bising tidak membuat ambang melewati batas atas
+THRESHOLD_MIN_DB = -55.0
+THRESHOLD_MAX_DB = -35.0
+# Jika yang tersisa kurang dari ini (misalnya mikrofon mati dan hanya merekam nol), file asli dipakai
+MIN_KEPT_SECONDS = 1.0
+# Persentil energi frame yang dipakai sebagai lantai derau
+NOISE_FLOOR_PERCENTILE = 5
+
+VAD_CACHE_DIR = os.getenv("VAD_CACHE_DIR", os.path.join("cache", "vad"))
+VAD_CACHE_MAX_BYTES = int(os.getenv("VAD_CACHE_MAX_MB", "1024")) * 1024 * 1024
+# File yang baru dipakai tidak dievict, mungkin sedang dipotong per segmen atau diupload
+IN_USE_SECONDS = 15 * 60
+# Jumlah frame analisis yang dibaca per iterasi, memori tetap kecil untuk rekaman berjam-jam
+BLOCK_WINDOWS = 2048
+BLOCK_FRAMES = 64 * 1024
+
+
+def settings():
+    """
+    Pengaturan yang memengaruhi hasil potongan, ikut menjadi kunci cache
+    """
+    return {
+        'frame_ms': VAD_FRAME_MS,
+        'min_silence_seconds': VAD_MIN_SILENCE_SECONDS,
+        'keep_silence_seconds': VAD_KEEP_SILENCE_SECONDS,
+        'margin_db': VAD_MARGIN_DB
+    }
+
+
+def frame_levels(path, frame_ms=VAD_FRAME_MS):
+    """
+    Energi RMS (dBFS) tiap frame dari WAV PCM 16-bit, dibaca per blok.
+    Mengembalikan (levels, frame_samples, rate, total_frames).
+    """
+    import numpy as np
+
+    with wave.open(path, 'rb') as src:
+        if src.getsampwidth() != 2:
+            raise ValueError("VAD hanya mendukung WAV PCM 16-bit")
+        channels = src.getnchannels()
+        rate = src.getframerate()
+        total_frames = src.getnframes()
+        frame_samples = max(int(rate * frame_ms / 1000), 1)
+
+        levels = []
+        while True:
+            block = src.readframes(frame_samples * BLOCK_WINDOWS)
+            if not block:
+                break
+            samples = np.frombuffer(block, dtype='<i2').astype(np.float32)
+            if channels > 1:
+                samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+            # Frame terakhir yang tidak penuh diisi nol
+            padding = -len(samples) % frame_samples
+            if padding:
+                samples = np.concatenate((samples, np.zeros(padding, dtype=np.float32)))
+            windows = samples.reshape(-1, frame_samples)
+            rms = np.sqrt(np.mean(windows * windows, axis=1))
+            levels.append(20 * np.log10(rms / 32768.0 + 1e-10))
+
+    levels = np.concatenate(levels) if levels else np.zeros(0, dtype=np.float32)
+    return levels, frame_samples, rate, total_frames
+
+
+def speech_mask(levels, margin_db=VAD_MARGIN_DB):
+    """
+    True untuk frame yang berisi suara; ambang mengikuti lantai derau rekaman ini
+    """
+    import numpy as np
+
+    if len(levels) == 0:
+        return np.zeros(0, dtype=bool)
+    threshold = np.percentile(levels, NOISE_FLOOR_PERCENTILE) + margin_db
+    return levels > min(max(threshold, THRESHOLD_MIN_DB), THRESHOLD_MAX_DB)
+
+
+def kept_spans(mask, min_silence_windows, keep_windows):
+    """
+    Rentang frame analisis (start, end) yang dipertahankan. Hening sepanjang min_silence_windows
+    atau lebih dipadatkan menjadi keep_windows; di awal dan akhir rekaman hanya sisi yang
+    berbatasan dengan suara yang disisakan.
+    """
+    import numpy as np
+
+    total = len(mask)
+    # Sentinel suara di kedua ujung: perubahan berikutnya selalu berpasangan (awal hening, akhir hening)
+    padded = np.concatenate(([True], mask, [True]))
+    changes = np.flatnonzero(padded[1:] != padded[:-1])
+    starts, ends = changes[0::2], changes[1::2]
+
+    long_runs = (ends - starts) >= min_silence_windows
+    starts, ends = starts[long_runs], ends[long_runs]
+    half = keep_windows // 2
+    cut_starts = np.where(starts == 0, 0, starts + half)
+    cut_ends = np.where(ends == total, total, ends - (keep_windows - half))
+    valid = cut_ends > cut_starts
+    cut_starts, cut_ends = cut_starts[valid], cut_ends[valid]
+
+    span_starts = np.concatenate(([0], cut_ends))
+    span_ends = np.concatenate((cut_starts, [total]))
+    nonempty = span_ends > span_starts
+    return list(zip(span_starts[nonempty].tolist(), span_ends[nonempty].tolist()))
+
+
+def trim(path, out_path):
+    """
+    Tulis WAV tanpa jeda hening panjang ke out_path dan kembalikan peta waktunya.
+    None jika tidak ada yang perlu dipotong atau hampir tidak ada suara (out_path tidak ditulis).
+    """
+    levels, frame_samples, rate, total_frames = frame_levels(path)
+    window_seconds = frame_samples / float(rate)
+    spans = kept_spans(
+        speech_mask(levels),
+        max(int(round(VAD_MIN_SILENCE_SECONDS / window_seconds)), 1),
+        int(round(VAD_KEEP_SILENCE_SECONDS / window_seconds))
+    )
+    # Frame analisis ke frame sampel; frame terakhir bisa lebih pendek
+    spans = [(start * frame_samples, min(end * frame_samples, total_frames)) for start, end in spans]
+    kept_frames = sum(end - start for start, end in spans)
+    if kept_frames >= total_frames or kept_frames < MIN_KEPT_SECONDS * rate:
+        return None
+
+    timemap = []
+    position = 0
+    with wave.open(path, 'rb') as src, wave.open(out_path, 'wb') as dst:
+        dst.setparams(src.getparams())
+        for start, end in spans:
+            src.setpos(start)
+            remaining = end - start
+            while remaining > 0:
+                block = src.readframes(min(BLOCK_FRAMES, remaining))
+                if not block:
+                    break
+                dst.writeframes(block)
+                remaining -= min(BLOCK_FRAMES, remaining)
+            timemap.append([position / float(rate), start / float(rate), (end - start) / float(rate)])
+            position += end - start
+
+    return {
+        'original_seconds': total_frames / float(rate),
+        'trimmed_seconds': position / float(rate),
+        'spans': timemap
+    }
+
+
+def to_original(timemap, seconds):
+    """
+    Waktu di file hasil potongan ke waktu di rekaman asli.
+    timemap['spans'] berisi [mulai di hasil, mulai di asli, durasi] per bagian yang dipertahankan.
+    """
+    spans = timemap['spans']
+    if not spans:
+        return seconds
+    index = max(bisect.bisect_right([span[0] for span in spans], seconds) - 1, 0)
+    trimmed_start, original_start, duration = spans[index]
+    return original_start + min(max(seconds - trimmed_start, 0), duration)
+
+
+def cache_path(name):
+    return os.path.join(VAD_CACHE_DIR, name)
+
+
+def _write_json(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=VAD_CACHE_DIR, suffix='.part')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def trimmed(path, digest):
+    """
+    Versi rekaman tanpa jeda hening panjang, di-cache per isi file dan pengaturan VAD.
+    Mengembalikan {'path', 'digest', 'timemap'}, atau None jika tidak ada yang dipotong
+    atau file bukan WAV PCM 16-bit.
+    """
+    key = hashlib.sha256(f"{digest}|{json.dumps(settings(), sort_keys=True)}".encode('utf-8')).hexdigest()
+    wav_path = cache_path(f"{key}.wav")
+    map_path = cache_path(f"{key}.json")
+
+    # Summarize dan modul untuk rekaman yang sama memotong sekali saja
+    with stage_lock(f"vad:{key}"):
+        timemap = None
+        if os.path.isfile(map_path):
+            with open(map_path) as f:
+                timemap = json.load(f)
+            if timemap.get('unchanged') or os.path.isfile(wav_path):
+                for used in (map_path, wav_path):
+                    if os.path.isfile(used):
+                        cachedir.touch(used)
+            else:
+                timemap = None
+
+        if timemap is None:
+            os.makedirs(VAD_CACHE_DIR, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=VAD_CACHE_DIR, suffix='.part')
+            os.close(fd)
+            try:
+                timemap = trim(path, tmp_path)
+            except (wave.Error, EOFError, ValueError):
+                os.remove(tmp_path)
+                return None
+            if timemap is None:
+                os.remove(tmp_path)
+                timemap = {'unchanged': True}
+            else:
+                os.replace(tmp_path, wav_path)
+            _write_json(map_path, timemap)
+            evict()
+
+    if timemap.get('unchanged'):
+        return None
+    return {'path': wav_path, 'digest': key, 'timemap': timemap}
+
+
+def evict():
+    return cachedir.evict(VAD_CACHE_DIR, VAD_CACHE_MAX_BYTES, min_age=IN_USE_SECONDS)